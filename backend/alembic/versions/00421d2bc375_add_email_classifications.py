@@ -0,0 +1,42 @@
+"""Add email_classifications for incremental job refresh
+
+Revision ID: 00421d2bc375
+Revises: 1964fe56cdff
+Create Date: 2026-10-19 14:02:16.845113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '00421d2bc375'
+down_revision: Union[str, None] = '1964fe56cdff'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'email_classifications',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email_id', sa.Integer(), nullable=False),
+        sa.Column('result', sa.String(), nullable=True),
+        sa.Column('confidence', sa.Float(), nullable=True),
+        sa.Column('model_version', sa.String(), nullable=True),
+        sa.Column('extracted_info', sa.Text(), nullable=True),
+        sa.Column('classified_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['email_id'], ['emails.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email_id'),
+    )
+    op.create_index(
+        op.f('ix_email_classifications_id'), 'email_classifications', ['id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_email_classifications_id'), table_name='email_classifications')
+    op.drop_table('email_classifications')
@@ -0,0 +1,30 @@
+"""Add job and candidate content hashes to matches
+
+Revision ID: 1964fe56cdff
+Revises: fa551f153965
+Create Date: 2026-10-19 12:40:51.302177
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1964fe56cdff'
+down_revision: Union[str, None] = 'fa551f153965'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('matches', sa.Column('job_hash', sa.String(length=64), nullable=True))
+    op.add_column('matches', sa.Column('candidate_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_matches_job_candidate', 'matches', ['job_id', 'candidate_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_matches_job_candidate', table_name='matches')
+    op.drop_column('matches', 'candidate_hash')
+    op.drop_column('matches', 'job_hash')
@@ -0,0 +1,93 @@
+"""Maintain email_threads stats with a trigger on emails
+
+Revision ID: 20b82de2a9ec
+Revises: a51bf37e65f5
+Create Date: 2026-10-19 10:03:27.551930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20b82de2a9ec'
+down_revision: Union[str, None] = 'a51bf37e65f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_email_thread_stats(target_thread_id varchar)
+        RETURNS void AS $$
+        BEGIN
+            UPDATE email_threads t SET
+                email_count = s.email_count,
+                participant_count = s.participant_count,
+                last_updated = COALESCE(s.last_updated, t.last_updated)
+            FROM (
+                SELECT count(*) AS email_count,
+                       count(DISTINCT sender) AS participant_count,
+                       max(received_date) AS last_updated
+                FROM emails
+                WHERE thread_id = target_thread_id
+            ) s
+            WHERE t.thread_id = target_thread_id;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION emails_thread_stats_trigger()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'DELETE' AND NEW.thread_id IS NOT NULL THEN
+                PERFORM refresh_email_thread_stats(NEW.thread_id);
+            END IF;
+            IF TG_OP = 'DELETE' OR OLD.thread_id IS DISTINCT FROM NEW.thread_id THEN
+                IF OLD.thread_id IS NOT NULL THEN
+                    PERFORM refresh_email_thread_stats(OLD.thread_id);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER emails_thread_stats
+        AFTER INSERT OR DELETE OR UPDATE OF thread_id, sender, received_date ON emails
+        FOR EACH ROW EXECUTE FUNCTION emails_thread_stats_trigger();
+        """
+    )
+
+    # Repair counters that drifted under the old hand-maintained updates
+    op.execute(
+        """
+        UPDATE email_threads t SET
+            email_count = COALESCE(s.email_count, 0),
+            participant_count = COALESCE(s.participant_count, 0),
+            last_updated = COALESCE(s.last_updated, t.last_updated)
+        FROM email_threads t2
+        LEFT JOIN (
+            SELECT thread_id,
+                   count(*) AS email_count,
+                   count(DISTINCT sender) AS participant_count,
+                   max(received_date) AS last_updated
+            FROM emails
+            GROUP BY thread_id
+        ) s ON s.thread_id = t2.thread_id
+        WHERE t.id = t2.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS emails_thread_stats ON emails")
+    op.execute("DROP FUNCTION IF EXISTS emails_thread_stats_trigger()")
+    op.execute("DROP FUNCTION IF EXISTS refresh_email_thread_stats(varchar)")
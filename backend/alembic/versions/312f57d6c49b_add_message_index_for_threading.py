@@ -0,0 +1,46 @@
+"""Add message_index and emails.in_reply_to for header-based threading
+
+Revision ID: 312f57d6c49b
+Revises: 440289e57a04
+Create Date: 2026-10-19 17:55:03.604125
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '312f57d6c49b'
+down_revision: Union[str, None] = '440289e57a04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('emails', sa.Column('in_reply_to', sa.String(), nullable=True))
+    op.create_index(op.f('ix_emails_in_reply_to'), 'emails', ['in_reply_to'], unique=False)
+
+    op.create_table(
+        'message_index',
+        sa.Column('message_id', sa.String(), nullable=False),
+        sa.Column('thread_id', sa.String(), nullable=False),
+        sa.Column('email_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['email_id'], ['emails.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('message_id'),
+    )
+    op.create_index(
+        op.f('ix_message_index_thread_id'), 'message_index', ['thread_id'], unique=False
+    )
+    op.create_index(
+        op.f('ix_message_index_email_id'), 'message_index', ['email_id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_message_index_email_id'), table_name='message_index')
+    op.drop_index(op.f('ix_message_index_thread_id'), table_name='message_index')
+    op.drop_table('message_index')
+    op.drop_index(op.f('ix_emails_in_reply_to'), table_name='emails')
+    op.drop_column('emails', 'in_reply_to')
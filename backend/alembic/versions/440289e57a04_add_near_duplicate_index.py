@@ -0,0 +1,66 @@
+"""Add MinHash fingerprints, LSH buckets and emails.duplicate_of_id
+
+Revision ID: 440289e57a04
+Revises: e458f4713183
+Create Date: 2026-10-19 17:12:40.218377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '440289e57a04'
+down_revision: Union[str, None] = 'e458f4713183'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('emails', sa.Column('duplicate_of_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'emails_duplicate_of_id_fkey',
+        'emails',
+        'emails',
+        ['duplicate_of_id'],
+        ['id'],
+        ondelete='SET NULL',
+    )
+    op.create_index(
+        op.f('ix_emails_duplicate_of_id'), 'emails', ['duplicate_of_id'], unique=False
+    )
+
+    op.create_table(
+        'email_fingerprints',
+        sa.Column('email_id', sa.Integer(), nullable=False),
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['email_id'], ['emails.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('email_id'),
+    )
+    op.create_table(
+        'email_lsh_buckets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.String(length=24), nullable=False),
+        sa.Column('email_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['email_id'], ['emails.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        op.f('ix_email_lsh_buckets_bucket'), 'email_lsh_buckets', ['bucket'], unique=False
+    )
+    op.create_index(
+        op.f('ix_email_lsh_buckets_email_id'), 'email_lsh_buckets', ['email_id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_email_lsh_buckets_email_id'), table_name='email_lsh_buckets')
+    op.drop_index(op.f('ix_email_lsh_buckets_bucket'), table_name='email_lsh_buckets')
+    op.drop_table('email_lsh_buckets')
+    op.drop_table('email_fingerprints')
+    op.drop_index(op.f('ix_emails_duplicate_of_id'), table_name='emails')
+    op.drop_constraint('emails_duplicate_of_id_fkey', 'emails', type_='foreignkey')
+    op.drop_column('emails', 'duplicate_of_id')
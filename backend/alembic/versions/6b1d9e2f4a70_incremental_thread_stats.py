@@ -0,0 +1,82 @@
+"""Update thread stats incrementally on insert
+
+Revision ID: 6b1d9e2f4a70
+Revises: e3850f6c64db
+Create Date: 2026-10-19 21:12:44.903117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b1d9e2f4a70'
+down_revision: Union[str, None] = 'e3850f6c64db'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_emails_thread_sender', 'emails', ['thread_id', 'sender'], unique=False
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION emails_thread_stats_trigger()
+        RETURNS trigger AS $$
+        BEGIN
+            -- Inserts adjust the counters in place; rescanning the thread on every
+            -- insert would make ingesting a long thread quadratic
+            IF TG_OP = 'INSERT' THEN
+                IF NEW.thread_id IS NOT NULL THEN
+                    UPDATE email_threads SET
+                        email_count = email_count + 1,
+                        participant_count = participant_count + CASE
+                            WHEN NEW.sender IS NOT NULL AND NOT EXISTS (
+                                SELECT 1 FROM emails
+                                WHERE thread_id = NEW.thread_id
+                                  AND sender = NEW.sender
+                                  AND id <> NEW.id
+                            ) THEN 1 ELSE 0 END,
+                        last_updated = GREATEST(last_updated, NEW.received_date)
+                    WHERE thread_id = NEW.thread_id;
+                END IF;
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'UPDATE' AND NEW.thread_id IS NOT NULL THEN
+                PERFORM refresh_email_thread_stats(NEW.thread_id);
+            END IF;
+            IF TG_OP = 'DELETE' OR OLD.thread_id IS DISTINCT FROM NEW.thread_id THEN
+                IF OLD.thread_id IS NOT NULL THEN
+                    PERFORM refresh_email_thread_stats(OLD.thread_id);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION emails_thread_stats_trigger()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'DELETE' AND NEW.thread_id IS NOT NULL THEN
+                PERFORM refresh_email_thread_stats(NEW.thread_id);
+            END IF;
+            IF TG_OP = 'DELETE' OR OLD.thread_id IS DISTINCT FROM NEW.thread_id THEN
+                IF OLD.thread_id IS NOT NULL THEN
+                    PERFORM refresh_email_thread_stats(OLD.thread_id);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.drop_index('ix_emails_thread_sender', table_name='emails')
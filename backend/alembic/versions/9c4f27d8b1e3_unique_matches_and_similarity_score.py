@@ -0,0 +1,69 @@
+"""Make matches unique per job/candidate and split out the cosine score
+
+Revision ID: 9c4f27d8b1e3
+Revises: 6b1d9e2f4a70
+Create Date: 2026-10-19 21:48:05.216730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4f27d8b1e3'
+down_revision: Union[str, None] = '6b1d9e2f4a70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('matches', sa.Column('similarity_score', sa.Float(), nullable=True))
+
+    # Unanalyzed rows came from batch matching, which stored the cosine
+    # similarity in match_score
+    op.execute(
+        """
+        UPDATE matches
+        SET similarity_score = match_score, match_score = NULL
+        WHERE ai_analysis IS NULL
+        """
+    )
+
+    # Keep one row per pair: reviewed over pending, analyzed over not, newest
+    op.execute(
+        """
+        DELETE FROM matches m
+        USING (
+            SELECT id, row_number() OVER (
+                PARTITION BY job_id, candidate_id
+                ORDER BY (coalesce(status, 'pending') <> 'pending') DESC,
+                         (ai_analysis IS NOT NULL) DESC,
+                         id DESC
+            ) AS rank
+            FROM matches
+        ) ranked
+        WHERE m.id = ranked.id AND ranked.rank > 1
+        """
+    )
+
+    op.drop_index('ix_matches_job_candidate', table_name='matches')
+    op.create_unique_constraint(
+        'uq_matches_job_candidate', 'matches', ['job_id', 'candidate_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_matches_job_candidate', 'matches', type_='unique')
+    op.create_index(
+        'ix_matches_job_candidate', 'matches', ['job_id', 'candidate_id'], unique=False
+    )
+    op.execute(
+        """
+        UPDATE matches
+        SET match_score = similarity_score
+        WHERE ai_analysis IS NULL
+        """
+    )
+    op.drop_column('matches', 'similarity_score')
@@ -0,0 +1,49 @@
+"""Add generated search_vector with GIN index to emails
+
+Revision ID: a51bf37e65f5
+Revises: 142f96275763
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a51bf37e65f5'
+down_revision: Union[str, None] = '142f96275763'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(subject, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(sender, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    op.add_column(
+        'emails',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(SEARCH_VECTOR, persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        'ix_emails_search_vector',
+        'emails',
+        ['search_vector'],
+        unique=False,
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_emails_search_vector', table_name='emails')
+    op.drop_column('emails', 'search_vector')
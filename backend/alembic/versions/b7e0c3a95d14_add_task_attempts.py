@@ -0,0 +1,30 @@
+"""Add tasks.attempts
+
+Revision ID: b7e0c3a95d14
+Revises: 9c4f27d8b1e3
+Create Date: 2026-10-19 22:31:09.558214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e0c3a95d14'
+down_revision: Union[str, None] = '9c4f27d8b1e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('attempts', sa.Integer(), nullable=True))
+    # A task running now has been claimed once
+    op.execute(
+        "UPDATE tasks SET attempts = CASE WHEN status = 'queued' THEN 0 ELSE 1 END"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'attempts')
@@ -0,0 +1,37 @@
+"""Add email_classifications.prefilter_score
+
+Revision ID: d2f5a8b4c617
+Revises: 4a8e61c0f2d9
+Create Date: 2026-10-19 23:40:18.672045
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f5a8b4c617'
+down_revision: Union[str, None] = '4a8e61c0f2d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'email_classifications', sa.Column('prefilter_score', sa.Float(), nullable=True)
+    )
+    # Skipped emails kept their score in extracted_info; the scores of
+    # emails that passed the prefilter were never stored
+    op.execute(
+        """
+        UPDATE email_classifications
+        SET prefilter_score = (extracted_info::json ->> 'prefilter_score')::float
+        WHERE model_version = 'keyword-prefilter-v1'
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('email_classifications', 'prefilter_score')
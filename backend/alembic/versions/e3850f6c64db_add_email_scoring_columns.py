@@ -0,0 +1,34 @@
+"""Add emails.scored_at and indexes for category/importance filtering
+
+Revision ID: e3850f6c64db
+Revises: 312f57d6c49b
+Create Date: 2026-10-19 18:41:27.318904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3850f6c64db'
+down_revision: Union[str, None] = '312f57d6c49b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('emails', sa.Column('scored_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_emails_scored_at'), 'emails', ['scored_at'], unique=False)
+    op.create_index(op.f('ix_emails_category'), 'emails', ['category'], unique=False)
+    op.create_index(
+        op.f('ix_emails_importance_score'), 'emails', ['importance_score'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_emails_importance_score'), table_name='emails')
+    op.drop_index(op.f('ix_emails_category'), table_name='emails')
+    op.drop_index(op.f('ix_emails_scored_at'), table_name='emails')
+    op.drop_column('emails', 'scored_at')
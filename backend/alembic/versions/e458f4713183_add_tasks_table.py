@@ -0,0 +1,45 @@
+"""Add tasks table for the background task queue
+
+Revision ID: e458f4713183
+Revises: 00421d2bc375
+Create Date: 2026-10-19 15:48:09.417652
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e458f4713183'
+down_revision: Union[str, None] = '00421d2bc375'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'tasks',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('params', sa.Text(), nullable=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('progress_current', sa.Integer(), nullable=True),
+        sa.Column('progress_total', sa.Integer(), nullable=True),
+        sa.Column('cancel_requested', sa.Boolean(), nullable=True),
+        sa.Column('worker', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_tasks_status_created_at', 'tasks', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_status_created_at', table_name='tasks')
+    op.drop_table('tasks')
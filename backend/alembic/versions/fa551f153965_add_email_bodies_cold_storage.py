@@ -0,0 +1,94 @@
+"""Add email_bodies cold storage and trigger-maintained search_vector
+
+Revision ID: fa551f153965
+Revises: 20b82de2a9ec
+Create Date: 2026-10-19 11:26:05.730662
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fa551f153965'
+down_revision: Union[str, None] = '20b82de2a9ec'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(subject, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(sender, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'email_bodies',
+        sa.Column('email_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.LargeBinary(), nullable=True),
+        sa.Column('html_content', sa.LargeBinary(), nullable=True),
+        sa.Column('stored_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['email_id'], ['emails.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('email_id'),
+    )
+    op.add_column(
+        'emails',
+        sa.Column(
+            'is_archived', sa.Boolean(), server_default=sa.false(), nullable=True
+        ),
+    )
+    op.create_index(
+        op.f('ix_emails_is_archived'), 'emails', ['is_archived'], unique=False
+    )
+
+    # Archived rows have NULL content, so the generated column can no longer
+    # express the document; keep the current values and maintain by trigger.
+    op.execute("ALTER TABLE emails ALTER COLUMN search_vector DROP EXPRESSION")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION emails_search_vector_trigger()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' OR (
+                NEW.content IS NOT NULL
+                AND (NEW.subject, NEW.sender, NEW.content)
+                    IS DISTINCT FROM (OLD.subject, OLD.sender, OLD.content)
+            ) THEN
+                NEW.search_vector :=
+                    setweight(to_tsvector('english', coalesce(NEW.subject, '')), 'A') ||
+                    setweight(to_tsvector('english', coalesce(NEW.sender, '')), 'B') ||
+                    setweight(to_tsvector('english', coalesce(NEW.content, '')), 'C');
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER emails_search_vector
+        BEFORE INSERT OR UPDATE ON emails
+        FOR EACH ROW EXECUTE FUNCTION emails_search_vector_trigger();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS emails_search_vector ON emails")
+    op.execute("DROP FUNCTION IF EXISTS emails_search_vector_trigger()")
+    # Archived content is lost to the generated column until bodies are restored
+    op.drop_index('ix_emails_search_vector', table_name='emails')
+    op.drop_column('emails', 'search_vector')
+    op.execute(
+        "ALTER TABLE emails ADD COLUMN search_vector tsvector "
+        f"GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED"
+    )
+    op.execute(
+        "CREATE INDEX ix_emails_search_vector ON emails USING gin (search_vector)"
+    )
+    op.drop_index(op.f('ix_emails_is_archived'), table_name='emails')
+    op.drop_column('emails', 'is_archived')
+    op.drop_table('email_bodies')
@@ -0,0 +1,226 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from models import JobPosting, Candidate, Match
+from vector_store import VectorStore
+from job_matcher import JobMatcher, record_id_from_metadata
+import numpy as np
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BatchMatcher:
+    """All-pairs job/candidate matching over the stored vectors"""
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        job_matcher: JobMatcher,
+        top_k: int = 20,
+        analyze_top: int = 3,
+        block_size: int = 1024,
+    ):
+        self.vector_store = vector_store
+        self.job_matcher = job_matcher
+        self.top_k = top_k
+        self.analyze_top = analyze_top
+        self.block_size = block_size
+
+    def _load_vectors(self, kind: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (record ids, L2-normalized float32 matrix) for one vector type"""
+        results = self.vector_store.collection.get(
+            where={"type": kind}, include=["embeddings", "metadatas"]
+        )
+        ids, vectors = [], []
+        for metadata, embedding in zip(results["metadatas"], results["embeddings"]):
+            record_id = record_id_from_metadata(metadata, kind)
+            if record_id is not None:
+                ids.append(record_id)
+                vectors.append(embedding)
+
+        if not vectors:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return np.asarray(ids, dtype=np.int64), matrix
+
+    def compute_shortlist(
+        self,
+        job_ids: np.ndarray,
+        job_matrix: np.ndarray,
+        candidate_ids: np.ndarray,
+        candidate_matrix: np.ndarray,
+    ) -> Dict[int, List[Tuple[int, float]]]:
+        """Top-k candidates per job by cosine similarity, in blocked products"""
+        shortlist: Dict[int, List[Tuple[int, float]]] = {}
+        if len(job_ids) == 0 or len(candidate_ids) == 0:
+            return shortlist
+
+        k = min(self.top_k, len(candidate_ids))
+        candidate_matrix_t = np.ascontiguousarray(candidate_matrix.T)
+
+        for start in range(0, len(job_ids), self.block_size):
+            scores = job_matrix[start : start + self.block_size] @ candidate_matrix_t
+
+            # Unordered top-k per row, then sort just those k
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            for row, job_id in enumerate(job_ids[start : start + self.block_size]):
+                shortlist[int(job_id)] = [
+                    (int(candidate_ids[col]), float(score))
+                    for col, score in zip(top[row], top_scores[row])
+                ]
+
+        return shortlist
+
+    def save_shortlist(
+        self, db: Session, shortlist: Dict[int, List[Tuple[int, float]]]
+    ) -> int:
+        """Replace unanalyzed pending matches of these jobs with the new shortlist"""
+        if not shortlist:
+            return 0
+
+        db.query(Match).filter(
+            Match.job_id.in_(list(shortlist)),
+            Match.ai_analysis.is_(None),
+            Match.status == "pending",
+        ).delete(synchronize_session=False)
+
+        # Duplicate vectors can repeat a pair; keep its best score
+        scores: Dict[Tuple[int, int], float] = {}
+        for job_id, hits in shortlist.items():
+            for candidate_id, score in hits:
+                key = (job_id, candidate_id)
+                scores[key] = max(score, scores.get(key, score))
+        rows = [
+            {
+                "job_id": job_id,
+                "candidate_id": candidate_id,
+                "similarity_score": score,
+                "status": "pending",
+            }
+            for (job_id, candidate_id), score in scores.items()
+        ]
+
+        # Pairs that already have a row (analyzed or reviewed) only get the
+        # new similarity; their analysis and status are kept
+        statement = insert(Match)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[Match.job_id, Match.candidate_id],
+                set_={"similarity_score": statement.excluded.similarity_score},
+            ),
+            rows,
+        )
+        db.commit()
+        return len(rows)
+
+    async def analyze_shortlist(
+        self,
+        db: Session,
+        shortlist: Dict[int, List[Tuple[int, float]]],
+        chunk_size: int = 50,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> int:
+        """Run LLM analysis for the top few candidates of each job"""
+        if self.analyze_top <= 0:
+            return 0
+
+        pairs_by_id = [
+            (job_id, candidate_id)
+            for job_id, hits in shortlist.items()
+            for candidate_id, _ in hits[: self.analyze_top]
+        ]
+        analyzed = 0
+        for start in range(0, len(pairs_by_id), chunk_size):
+            chunk = pairs_by_id[start : start + chunk_size]
+            jobs = {
+                job.id: job
+                for job in db.query(JobPosting).filter(
+                    JobPosting.id.in_({job_id for job_id, _ in chunk})
+                )
+            }
+            candidates = {
+                candidate.id: candidate
+                for candidate in db.query(Candidate).filter(
+                    Candidate.id.in_({candidate_id for _, candidate_id in chunk})
+                )
+            }
+            pairs = [
+                (jobs[job_id], candidates[candidate_id])
+                for job_id, candidate_id in chunk
+                if job_id in jobs and candidate_id in candidates
+            ]
+            # Stored analyses with unchanged inputs are reused, not re-billed
+            await self.job_matcher._get_analyses(db, pairs)
+            db.commit()
+            analyzed += len(pairs)
+            if progress:
+                progress(min(start + chunk_size, len(pairs_by_id)), len(pairs_by_id))
+
+        return analyzed
+
+    async def run(
+        self,
+        db: Session,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> Dict:
+        """Match all active jobs against all candidates"""
+        started = time.perf_counter()
+
+        job_ids, job_matrix = await asyncio.to_thread(self._load_vectors, "job")
+        active = {
+            job_id
+            for (job_id,) in db.query(JobPosting.id).filter(
+                JobPosting.status == "active"
+            )
+        }
+        keep = np.isin(job_ids, list(active))
+        job_ids, job_matrix = job_ids[keep], job_matrix[keep]
+        candidate_ids, candidate_matrix = await asyncio.to_thread(
+            self._load_vectors, "candidate"
+        )
+        loaded = time.perf_counter()
+
+        shortlist = self.compute_shortlist(
+            job_ids, job_matrix, candidate_ids, candidate_matrix
+        )
+        scored = time.perf_counter()
+
+        saved = self.save_shortlist(db, shortlist)
+        analyzed = await self.analyze_shortlist(db, shortlist, progress=progress)
+        finished = time.perf_counter()
+
+        stats = {
+            "jobs": int(len(job_ids)),
+            "candidates": int(len(candidate_ids)),
+            "matches_saved": saved,
+            "matches_analyzed": analyzed,
+            "load_seconds": round(loaded - started, 3),
+            "score_seconds": round(scored - loaded, 3),
+            "total_seconds": round(finished - started, 3),
+        }
+        logger.info(f"Batch matching complete: {stats}")
+        return stats
+
+
+if __name__ == "__main__":
+    import asyncio
+    from services import services
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        print(asyncio.run(services.batch_matcher.run(db)))
+    finally:
+        db.close()
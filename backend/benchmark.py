@@ -0,0 +1,372 @@
+"""Offline benchmark for ingestion and retrieval.
+
+Loads the emails.json / email_parts corpus (plus generated replies and
+near-duplicates) into a scratch Postgres database and a temporary embedded
+Chroma store, using fake_openai.FakeOpenAI so no API key or network is
+needed. Reports ingestion throughput, find_similar_emails and search_emails
+latency percentiles, per-stage and per-dependency time and peak RSS as
+JSON, so results can be diffed between commits.
+
+The benchmark database is dropped and recreated on every run.
+
+Usage: python benchmark.py [--database-url URL] [--corpus PATH ...]
+                           [--synthetic N] [--queries N] [--output FILE]
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATABASE_URL = "postgresql://postgres@localhost:5432/emaildb_bench"
+
+
+def load_corpus(paths: List[str]) -> List[Dict]:
+    """Emails from JSON files, or from every *.json file in a directory"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.endswith(".json")
+            )
+        else:
+            files.append(path)
+
+    emails, seen = [], set()
+    for filename in files:
+        with open(filename) as f:
+            for item in json.load(f):
+                # email_parts/ is a split of emails.json; don't load twice
+                if item["message_id"] in seen:
+                    continue
+                seen.add(item["message_id"])
+                emails.append(
+                    {
+                        "message_id": item["message_id"],
+                        "subject": item.get("subject") or "No Subject",
+                        "sender": item.get("sender") or "Unknown",
+                        "content": item.get("content") or "No content",
+                        "html_content": item.get("html_content"),
+                        "received_date": datetime.fromisoformat(
+                            item["received_date"]
+                        ),
+                        "in_reply_to": None,
+                        "references": [],
+                    }
+                )
+    return emails
+
+
+def generate_emails(corpus: List[Dict], count: int, seed: int) -> List[Dict]:
+    """Replies (threaded by headers) and lightly edited re-posts of corpus mail"""
+    generator = random.Random(seed)
+    generated = []
+    for i in range(count):
+        original = generator.choice(corpus + generated)
+        message_id = f"<bench-{seed}-{i}@generated>"
+        if generator.random() < 0.7:
+            sentences = original["content"].split(". ")
+            generated.append(
+                {
+                    **original,
+                    "message_id": message_id,
+                    "subject": f"Re: {original['subject']}",
+                    "sender": f"member{generator.randrange(50)}@example.com",
+                    "content": ". ".join(generator.sample(sentences, len(sentences))),
+                    "html_content": None,
+                    "in_reply_to": original["message_id"],
+                    "references": original["references"] + [original["message_id"]],
+                }
+            )
+        else:
+            generated.append(
+                {
+                    **original,
+                    "message_id": message_id,
+                    "content": f"{original['content']}\n\n-- \nSent from my phone",
+                    "in_reply_to": None,
+                    "references": [],
+                }
+            )
+    return generated
+
+
+def percentiles(samples: List[float]) -> Dict:
+    """Count, mean and p50/p95/p99 (linear interpolation) in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(q: float) -> float:
+        position = (len(ordered) - 1) * q
+        low = int(position)
+        high = min(low + 1, len(ordered) - 1)
+        value = ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+        return round(value * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=REPO_ROOT,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dependency_totals() -> Dict:
+    """Calls and seconds spent per external dependency so far"""
+    import metrics
+
+    def collapse(histogram, label_index: Optional[int] = None) -> Dict:
+        totals: Dict = {}
+        for key, (count, seconds) in histogram.totals().items():
+            name = key[label_index] if label_index is not None else "all"
+            calls, spent = totals.get(name, (0, 0.0))
+            totals[name] = (calls + count, spent + seconds)
+        return {
+            name: {"calls": calls, "seconds": round(spent, 4)}
+            for name, (calls, spent) in totals.items()
+        }
+
+    return {
+        "embedding": collapse(metrics.EMBEDDING_LATENCY),
+        "llm_chat": collapse(metrics.LLM_LATENCY),
+        "vector_store": collapse(metrics.VECTOR_LATENCY, 0),
+        "db": collapse(metrics.DB_LATENCY),
+    }
+
+
+def dependency_delta(before: Dict, after: Dict) -> Dict:
+    delta = {}
+    for dependency, entries in after.items():
+        delta[dependency] = {}
+        for name, totals in entries.items():
+            previous = before.get(dependency, {}).get(name, {"calls": 0, "seconds": 0})
+            delta[dependency][name] = {
+                "calls": totals["calls"] - previous["calls"],
+                "seconds": round(totals["seconds"] - previous["seconds"], 4),
+            }
+    return delta
+
+
+async def run(args) -> Dict:
+    # database.py reads DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    import query_stats
+    from config import Settings
+    from database import Base, SessionLocal, engine, init_db
+    from fake_openai import FakeOpenAI
+    from import_mbox import process_email
+    from models import Email
+    from services import Services
+    from sqlalchemy.orm import selectinload
+
+    query_stats.install(engine, slow_query_threshold_ms=float("inf"))
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+
+    chroma_dir = tempfile.mkdtemp(prefix="ebot-bench-chroma-")
+    settings = Settings(
+        database_url=args.database_url,
+        chroma_persist_directory=chroma_dir,
+        chroma_server_host=None,
+        # Unused offline, but required by Settings
+        imap_port=993,
+        email_address="bench@example.com",
+        email_password="",
+        secret_key="bench",
+        algorithm="HS256",
+        access_token_expire_minutes=30,
+    )
+    container = Services(
+        settings, openai_client=FakeOpenAI(latency_seconds=args.fake_latency_ms / 1000)
+    )
+
+    corpus = load_corpus(args.corpus)
+    if args.limit:
+        corpus = corpus[: args.limit]
+    emails = corpus + generate_emails(corpus, args.synthetic, args.seed)
+    stages: Dict[str, Dict] = {}
+
+    @contextlib.contextmanager
+    def stage(name: str):
+        before = dependency_totals()
+        started = time.perf_counter()
+        yield
+        stages[name] = {
+            "seconds": round(time.perf_counter() - started, 4),
+            "dependencies": dependency_delta(before, dependency_totals()),
+            "max_rss_mb": max_rss_mb(),
+        }
+
+    db = SessionLocal()
+    try:
+        with stage("startup"):
+            await container.startup()
+
+        ingested, failed, touched_threads = 0, 0, set()
+        with stage("ingest"):
+            for email_data in emails:
+                # Rolls back its own savepoint when it fails
+                email_record = await process_email(dict(email_data), db, container)
+                if email_record is None:
+                    failed += 1
+                    continue
+                ingested += 1
+                touched_threads.add(email_record.thread_id)
+                if ingested % 50 == 0:
+                    db.commit()
+                    await container.threading_engine.apply_relabels(db)
+            db.commit()
+            await container.threading_engine.apply_relabels(db)
+        ingest_seconds = stages["ingest"]["seconds"]
+
+        with stage("reply_index"):
+            pairs = await container.reply_index.index_threads(db, touched_threads)
+
+        with stage("scoring"):
+            scoring = await container.email_scorer.run(db, full=True)
+
+        # Near-duplicates count as ingested but have no vector to query with
+        embedded = (
+            db.query(Email)
+            .options(selectinload(Email.body))
+            .filter(Email.embedding_id.isnot(None))
+            .all()
+        )
+        generator = random.Random(args.seed)
+        sample = generator.sample(embedded, min(args.queries, len(embedded)))
+
+        # find_similar_emails prints its LLM exchange; keep stdout clean
+        similar_latencies = []
+        with stage("find_similar_emails"), open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(devnull):
+                for email in sample:
+                    started = time.perf_counter()
+                    await container.vector_store.find_similar_emails(
+                        email.content,
+                        db,
+                        n_results=3,
+                        current_thread_id=email.thread_id,
+                        original_email={
+                            "subject": email.subject,
+                            "content": email.content,
+                            "id": email.id,
+                            "thread_id": email.thread_id,
+                        },
+                    )
+                    similar_latencies.append(time.perf_counter() - started)
+
+        search_latencies = []
+        with stage("search_emails"):
+            for email in sample:
+                started = time.perf_counter()
+                await container.vector_store.search_emails(email.subject, db)
+                search_latencies.append(time.perf_counter() - started)
+    finally:
+        db.close()
+        await container.shutdown()
+        shutil.rmtree(chroma_dir, ignore_errors=True)
+
+    return {
+        "started_at": datetime.utcnow().isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "corpus": args.corpus,
+            "corpus_emails": len(corpus),
+            "synthetic_emails": args.synthetic,
+            "queries": len(sample),
+            "seed": args.seed,
+            "fake_latency_ms": args.fake_latency_ms,
+            "vector_batch_size": settings.vector_batch_size,
+        },
+        "ingest": {
+            "emails": ingested,
+            "failed": failed,
+            "seconds": ingest_seconds,
+            "emails_per_sec": round(ingested / ingest_seconds, 2)
+            if ingest_seconds
+            else None,
+            "threads": len(touched_threads),
+            "reply_pairs": pairs,
+            "scoring": scoring,
+        },
+        "find_similar_emails": percentiles(similar_latencies),
+        "search_emails": percentiles(search_latencies),
+        "stages": stages,
+        "memory": {"max_rss_mb": max_rss_mb()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offline ingestion/retrieval benchmark"
+    )
+    parser.add_argument(
+        "--database-url",
+        default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL),
+        help="scratch database; its tables are dropped",
+    )
+    parser.add_argument(
+        "--corpus",
+        nargs="+",
+        default=[os.path.join(REPO_ROOT, "emails.json")],
+        help="JSON files or directories such as email_parts/",
+    )
+    parser.add_argument("--limit", type=int, default=None, help="corpus emails to use")
+    parser.add_argument("--synthetic", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--fake-latency-ms", type=float, default=0.0, help="delay per fake API call"
+    )
+    parser.add_argument("--output", default=None, help="write JSON here, not stdout")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if args.database_url == os.getenv("DATABASE_URL"):
+        parser.error("refusing to drop the tables of DATABASE_URL; use a scratch DB")
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
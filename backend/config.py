@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 from dotenv import load_dotenv, find_dotenv
 import os
 
@@ -39,9 +39,69 @@ class Settings(BaseSettings):
 
     # Vector DB
     chroma_persist_directory: str = "./chroma_db"
+    # Set to use a standalone Chroma server (`chroma run`) instead of the embedded store
+    chroma_server_host: Optional[str] = None
+    chroma_server_port: int = 8001
+    chroma_server_ssl: bool = False
+    vector_batch_size: int = 100  # texts per embeddings request / Chroma add
+
+    # Near-duplicate detection at ingest
+    near_duplicate_enabled: bool = True
+    near_duplicate_threshold: float = 0.85  # estimated Jaccard to reuse a vector
 
     # OpenAI
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
+    # e.g. http://localhost:8100/v1 for mock_openai_server.py
+    openai_base_url: Optional[str] = None
+    # Per-model requests/tokens per minute; keep just under the account's tier
+    openai_model_limits: Dict[str, Dict[str, int]] = {
+        "gpt-4o-mini": {"rpm": 450, "tpm": 180000},
+        "text-embedding-3-small": {"rpm": 2700, "tpm": 900000},
+    }
+    # Fraction of those limits each process may use; buckets are per process,
+    # so set to 1 / (API workers + task worker processes)
+    openai_limit_share: float = 1.0
+    openai_max_in_flight: int = 16
+    openai_max_retries: int = 5
+
+    # Job matching
+    match_analysis_concurrency: int = 5
+    batch_match_analysis: bool = False  # score all hits in one LLM call
+    batch_match_top_k: int = 20  # shortlist size per job in all-pairs runs
+    batch_match_analyze_top: int = 3  # shortlisted pairs per job sent to the LLM
+
+    # Job/candidate extraction from email
+    classification_concurrency: int = 5
+    classification_batch_size: int = 100
+    prefilter_enabled: bool = True
+    prefilter_threshold: float = 2.0  # lower = more recall, fewer skipped calls
+    rule_extraction_min_confidence: float = 0.8  # below this, fall back to the LLM
+
+    # Batch category/importance scoring
+    scoring_block_size: int = 1000
+    scoring_min_category_similarity: float = 0.3  # below this the category is "other"
+
+    # Semantic cache for /auto-reply/ decisions
+    auto_reply_cache_enabled: bool = True
+    auto_reply_cache_threshold: float = 0.97  # cosine similarity to reuse an answer
+    auto_reply_cache_ttl_seconds: int = 3600
+    auto_reply_cache_max_entries: int = 1000
+
+    # /search/ falls back to full-text search below this vector score
+    search_min_similarity: float = 0.3
+
+    # SQL instrumentation
+    slow_query_threshold_ms: float = 200.0
+    query_count_warning: int = 50
+
+    # Cold storage for email bodies
+    archive_after_days: int = 90
+    archive_interval_minutes: int = 60  # task worker only; 0 disables the archiver
+
+    # Background tasks (run by task_worker.py)
+    task_poll_interval_seconds: float = 2.0
+    task_stale_after_seconds: int = 300  # requeue running tasks without a heartbeat
+    task_max_attempts: int = 3  # fail a task whose workers keep dying instead
 
     class Config:
         env_file = ".env"
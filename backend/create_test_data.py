@@ -2,6 +2,7 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from models import Email, EmailThread, JobPosting, Candidate, Match
 from database import SessionLocal, init_db
+from job_rules import extract_job_fields
 import uuid
 import random
 import re
@@ -342,8 +343,6 @@ for subject in thread_subjects:
         thread_id=str(uuid.uuid4()),
         subject=subject,
         last_updated=datetime.utcnow(),
-        participant_count=1,
-        email_count=1,
     )
     threads.append(thread)
 
@@ -445,11 +444,6 @@ for thread in threads:
         )
         emails.append(reply_email)
 
-        # Update thread's participant count and email count
-        thread.participant_count += 1
-        thread.email_count += 1
-        thread.last_updated = reply_email.received_date
-
 db.add_all(emails)
 db.commit()
 
@@ -459,40 +453,16 @@ print(f"Created {len(threads)} email threads and {len(emails)} emails successful
 job_postings = []
 for email in emails:
     if email.category == "job_posting":
-        # Extract salary range from content if available
-        salary_range = None
-        if "salary" in email.content.lower():
-            # Simple regex to find salary ranges like $150k-$200k
-            salary_match = re.search(r"\$\d+k-\$\d+k", email.content)
-            if salary_match:
-                salary_range = salary_match.group(0)
-
-        # Extract location if available
-        location = "Remote"  # Default to remote
-        if "location" in email.content.lower():
-            location_match = re.search(r"location:?\s*([^.•\n]+)", email.content, re.I)
-            if location_match:
-                location = location_match.group(1).strip()
-
-        # Extract requirements
-        requirements = []
-        if "requirements:" in email.content.lower():
-            req_section = (
-                email.content.lower().split("requirements:")[1].split("\n\n")[0]
-            )
-            requirements = [
-                r.strip("- ").strip() for r in req_section.split("\n") if r.strip()
-            ]
+        # Same rule-based extraction the /jobs/refresh/ fast path uses
+        fields, _ = extract_job_fields(email.subject, email.content, email.sender)
 
         job_posting = JobPosting(
-            title=email.subject.replace("Position at", "")
-            .replace("Role at", "")
-            .strip(),
-            company=email.sender.split("@")[1].split(".")[0].title(),
+            title=fields.get("title", email.subject),
+            company=fields.get("company", "Unknown"),
             description=email.content,
-            requirements=requirements,
-            location=location,
-            salary_range=salary_range,
+            requirements=fields.get("requirements", ""),
+            location=fields.get("location", "Remote"),  # Default to remote
+            salary_range=fields.get("salary_range"),
             created_at=email.received_date,
             status="active",
             embedding_id=str(uuid.uuid4()),
@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from typing import Iterator
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -9,10 +11,13 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Force PostgreSQL URL
-DATABASE_URL = "postgresql://postgres@localhost:5432/emaildb"
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres@localhost:5432/emaildb")
 logger.info(f"Using database URL: {DATABASE_URL}")
 
-engine = create_engine(DATABASE_URL, echo=True)  # Enable SQL logging
+# Statement logging is opt-in; per-request timing lives in query_stats
+engine = create_engine(
+    DATABASE_URL, echo=os.getenv("SQL_ECHO", "false").lower() == "true"
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -23,6 +28,20 @@ def init_db():
     logger.info("Database initialized successfully")
 
 
+@contextmanager
+def advisory_lock(lock_id: int) -> Iterator[bool]:
+    """Try a session-level pg advisory lock on its own connection; yields if held"""
+    with engine.connect() as conn:
+        locked = conn.execute(
+            text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id}
+        ).scalar()
+        try:
+            yield locked
+        finally:
+            if locked:
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session, selectinload
+from database import SessionLocal, advisory_lock
+from models import Email
+from config import Settings
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# pg advisory lock key, so one archiver runs at a time across worker processes
+ARCHIVER_LOCK_ID = 0x656D6172
+
+
+def archive_old_emails(db: Session, older_than_days: int, batch_size: int = 500) -> int:
+    """Move bodies of old emails, and any HTML still in the hot table, to cold storage"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    processed = 0
+
+    while True:
+        # Every processed row drops out of this filter, so the loop terminates
+        emails = (
+            db.query(Email)
+            .options(selectinload(Email.body))
+            .filter(
+                or_(
+                    Email._html_content.isnot(None),
+                    and_(
+                        Email.is_archived.isnot(True),
+                        Email.received_date < cutoff,
+                    ),
+                )
+            )
+            .order_by(Email.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not emails:
+            break
+
+        for email in emails:
+            email.archive_body(
+                include_content=email.received_date is not None
+                and email.received_date < cutoff
+            )
+
+        db.commit()
+        processed += len(emails)
+
+    return processed
+
+
+async def run_archiver(settings: Settings):
+    """Periodically archive old email bodies until cancelled"""
+    if settings.archive_interval_minutes <= 0:
+        return
+
+    def archive_once() -> int:
+        with advisory_lock(ARCHIVER_LOCK_ID) as locked:
+            if not locked:
+                return 0
+            db = SessionLocal()
+            try:
+                return archive_old_emails(db, settings.archive_after_days)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+    while True:
+        try:
+            archived = await asyncio.to_thread(archive_once)
+            if archived:
+                logger.info(f"Moved {archived} email bodies to cold storage")
+        except Exception as e:
+            logger.error(f"Error archiving emails: {str(e)}")
+        await asyncio.sleep(settings.archive_interval_minutes * 60)
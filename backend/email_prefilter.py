@@ -0,0 +1,71 @@
+from typing import Dict, List, Tuple
+import re
+
+PREFILTER_VERSION = "keyword-prefilter-v1"
+
+# (pattern, weight) pairs; subject matches count double
+JOB_SIGNALS: List[Tuple[str, float]] = [
+    (r"\bwe(?:'re| are) (?:hiring|looking for|seeking)\b", 3.0),
+    (r"\b(?:hiring|job|position|role|opening|vacancy|internship)s?\b", 1.0),
+    (r"\b(?:requirements|qualifications|responsibilities)\s*:", 2.0),
+    (r"\b(?:salary|compensation|equity|benefits)\b", 1.0),
+    (r"\$\s?\d{2,3}(?:,\d{3}|k)\b", 1.5),
+    (r"\b(?:full[- ]time|part[- ]time|contract|remote)\b", 0.5),
+    (r"\bsend (?:us )?your (?:resume|cv)\b|\bapply\b", 1.5),
+    (r"\b\d+\+? years? of (?:\w+ )?experience\b", 1.5),
+]
+
+CANDIDATE_SIGNALS: List[Tuple[str, float]] = [
+    (r"\b(?:my|attached) (?:resume|cv)\b", 3.0),
+    (
+        r"\b(?:looking for|seeking|open to) (?:a |new )?"
+        r"(?:job|role|position|opportunit(?:y|ies)|work)\b",
+        3.0,
+    ),
+    (
+        r"\bi(?:'m| am) (?:a|an) [\w\s-]{0,40}"
+        r"(?:engineer|developer|designer|scientist|manager)\b",
+        1.5,
+    ),
+    (r"\bmy (?:background|experience|skills)\b", 1.0),
+    (r"\binterested in the [\w\s-]{0,40}(?:position|role)\b", 2.0),
+    (r"\b(?:linkedin\.com/in|github\.com)/", 1.0),
+]
+
+
+class EmailPrefilter:
+    """Cheap keyword scorer deciding whether an email needs LLM classification"""
+
+    def __init__(self, threshold: float = 2.0, max_chars: int = 5000):
+        # Lower threshold = higher recall (more emails sent to the LLM)
+        self.threshold = threshold
+        self.max_chars = max_chars
+        self._job_signals = [(re.compile(p, re.I), w) for p, w in JOB_SIGNALS]
+        self._candidate_signals = [
+            (re.compile(p, re.I), w) for p, w in CANDIDATE_SIGNALS
+        ]
+
+    @staticmethod
+    def _score_signals(signals, subject: str, content: str) -> float:
+        score = 0.0
+        for pattern, weight in signals:
+            if pattern.search(subject):
+                score += 2 * weight
+            elif pattern.search(content):
+                score += weight
+        return score
+
+    def score(self, subject: str, content: str) -> Dict[str, float]:
+        subject = subject or ""
+        content = (content or "")[: self.max_chars]
+        return {
+            "job_posting": self._score_signals(self._job_signals, subject, content),
+            "candidate_profile": self._score_signals(
+                self._candidate_signals, subject, content
+            ),
+        }
+
+    def needs_llm(self, subject: str, content: str) -> Tuple[bool, float]:
+        """Return (send to LLM?, best score)"""
+        best = max(self.score(subject, content).values())
+        return best >= self.threshold, best
@@ -1,27 +1,45 @@
-from imapclient import IMAPClient
 import email
 from email.header import decode_header
-from bs4 import BeautifulSoup
 from datetime import datetime
-from typing import List, Optional, Union
-import hashlib
+from typing import TYPE_CHECKING, Callable, List, Optional, Union
 from sqlalchemy.orm import Session
 import email.utils
+import asyncio
 import logging
 from fastapi import HTTPException
 
-from models import Email, EmailThread
+from models import Email
 from vector_store import VectorStore
+from reply_index import ReplyIndex
+from near_duplicates import NearDuplicateIndex
+from email_threading import ThreadingEngine, thread_headers
+from task_queue import TaskCancelled
 from config import Settings
+import metrics
+
+if TYPE_CHECKING:
+    from imapclient import IMAPClient
 
 
 class EmailProcessor:
-    def __init__(self, settings: Settings):
+    def __init__(
+        self,
+        settings: Settings,
+        vector_store: VectorStore,
+        reply_index: Optional[ReplyIndex] = None,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+        threading_engine: Optional[ThreadingEngine] = None,
+    ):
         self.settings = settings
-        self.vector_store = VectorStore(settings)
+        self.vector_store = vector_store
+        self.reply_index = reply_index
+        self.near_duplicates = near_duplicates
+        self.threading_engine = threading_engine or ThreadingEngine(vector_store)
 
-    async def connect_to_imap(self) -> IMAPClient:
+    async def connect_to_imap(self) -> "IMAPClient":
         """Establish IMAP connection with proper error handling"""
+        from imapclient import IMAPClient
+
         try:
             server = IMAPClient(
                 self.settings.imap_server,
@@ -106,21 +124,20 @@ class EmailProcessor:
 
             if html_content:
                 # Extract text from HTML
+                from bs4 import BeautifulSoup
+
                 soup = BeautifulSoup(html_content, "html.parser")
                 if not content:  # Only use HTML content if we don't have plain text
                     content = soup.get_text(separator=" ", strip=True)
 
-            # Generate thread ID based on normalized subject
-            clean_subject = "".join(e for e in subject if e.isalnum()).lower()
-            thread_id = hashlib.md5(clean_subject.encode()).hexdigest()
-
+            # Threading uses Message-ID/In-Reply-To/References (see email_threading)
             return {
                 "subject": subject,
                 "sender": from_addr,
                 "content": content or "No content",
                 "html_content": html_content,
                 "received_date": received_date,
-                "thread_id": thread_id,
+                **thread_headers(msg),
             }
         except Exception as e:
             logging.error(f"Error parsing email: {str(e)}")
@@ -128,8 +145,37 @@ class EmailProcessor:
                 status_code=500, detail=f"Error parsing email: {str(e)}"
             )
 
-    async def process_all_emails(self, db: Session) -> List[Email]:
-        """Process all emails from IMAP server"""
+    async def _discard_vectors(self, embedding_ids: List[str]):
+        """Delete vectors that no stored email points at"""
+        if not embedding_ids:
+            return
+        try:
+            await asyncio.to_thread(
+                self.vector_store.collection.delete, ids=embedding_ids
+            )
+        except Exception as e:
+            logging.error(f"Error deleting orphaned vectors: {str(e)}")
+
+    async def _apply_relabels(self, db: Session):
+        try:
+            await self.threading_engine.apply_relabels(db)
+        except Exception as e:
+            logging.error(f"Error relabelling merged threads: {str(e)}")
+
+    async def process_all_emails(
+        self,
+        db: Session,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> List[Email]:
+        """Process all emails from IMAP server.
+
+        Commits every vector_batch_size emails, so a cancel or failure only
+        loses the current batch; that batch's new vectors are deleted.
+        """
+        batch_size = self.settings.vector_batch_size
+        added: List[str] = []  # vectors of emails not committed yet
+        # Old vectors of re-embedded emails, deleted once the swap commits
+        replaced: List[str] = []
         try:
             server = await self.connect_to_imap()
 
@@ -150,46 +196,60 @@ class EmailProcessor:
 
             processed_emails = []
 
-            for uid, message_data in server.fetch(messages, ["RFC822"]).items():
+            for index, (uid, message_data) in enumerate(
+                server.fetch(messages, ["RFC822"]).items(), start=1
+            ):
+                # Savepoint so a failed email doesn't discard the batch
+                savepoint = db.begin_nested()
+                embedding_id = old_embedding_id = None
                 try:
                     email_message = email.message_from_bytes(message_data[b"RFC822"])
                     parsed_email = self.parse_email_message(email_message)
 
-                    # Create embedding for the email content
-                    embedding_id = await self.vector_store.add_text(
-                        parsed_email["content"],
-                        metadata={
-                            "subject": parsed_email["subject"],
-                            "thread_id": parsed_email["thread_id"],
-                        },
+                    email_record = (
+                        db.query(Email).filter(Email.message_id == str(uid)).first()
                     )
 
-                    # Handle thread creation/update
-                    thread = (
-                        db.query(EmailThread)
-                        .filter(EmailThread.thread_id == parsed_email["thread_id"])
-                        .first()
-                    )
+                    if email_record:
+                        parsed_email["thread_id"] = email_record.thread_id
+                    else:
+                        parsed_email["thread_id"] = self.threading_engine.assign(
+                            db,
+                            parsed_email["message_id_header"],
+                            parsed_email["in_reply_to"],
+                            parsed_email["references"],
+                            parsed_email["subject"],
+                            parsed_email["received_date"],
+                        )
 
-                    if not thread:
-                        thread = EmailThread(
-                            thread_id=parsed_email["thread_id"],
-                            subject=parsed_email["subject"],
-                            last_updated=parsed_email["received_date"],
-                            participant_count=1,
-                            email_count=1,
+                    # Near-duplicates of a stored email link to it instead of
+                    # getting their own embedding
+                    signature = duplicate_of_id = None
+                    if self.near_duplicates is not None and not email_record:
+                        signature = self.near_duplicates.signature(
+                            parsed_email["content"]
+                        )
+                        match = (
+                            self.near_duplicates.find_duplicate(db, signature)
+                            if signature is not None
+                            else None
+                        )
+                        if match:
+                            duplicate_of_id = match[0]
+                    elif email_record:
+                        duplicate_of_id = email_record.duplicate_of_id
+
+                    if duplicate_of_id is None:
+                        # Create embedding for the email content
+                        embedding_id = await self.vector_store.add_text(
+                            parsed_email["content"],
+                            metadata={
+                                "subject": parsed_email["subject"],
+                                "thread_id": parsed_email["thread_id"],
+                            },
                         )
-                        db.add(thread)
-                        db.flush()
-                    else:
-                        thread.last_updated = parsed_email["received_date"]
-                        thread.email_count += 1
 
                     # Create or update email record
-                    email_record = (
-                        db.query(Email).filter(Email.message_id == str(uid)).first()
-                    )
-
                     if not email_record:
                         email_record = Email(
                             message_id=str(uid),
@@ -200,33 +260,87 @@ class EmailProcessor:
                             html_content=parsed_email["html_content"],
                             received_date=parsed_email["received_date"],
                             thread_id=parsed_email["thread_id"],
+                            in_reply_to=parsed_email["in_reply_to"],
                             embedding_id=embedding_id,
+                            duplicate_of_id=duplicate_of_id,
                             is_processed=True,
                         )
                         db.add(email_record)
+                        # Thread stats are maintained by a DB trigger
+                        db.flush()
+                        self.threading_engine.link(
+                            db, email_record, parsed_email["message_id_header"]
+                        )
+                        if signature is not None:
+                            self.near_duplicates.add(db, email_record, signature)
+                        outcome = "duplicate" if duplicate_of_id else "new"
                     else:
-                        email_record.embedding_id = embedding_id
+                        old_embedding_id = email_record.embedding_id
+                        if embedding_id:
+                            email_record.embedding_id = embedding_id
                         email_record.is_processed = True
+                        outcome = "updated"
+
+                    savepoint.commit()
+                    if embedding_id:
+                        added.append(embedding_id)
+                        if old_embedding_id:
+                            replaced.append(old_embedding_id)
+                    metrics.EMAILS_INGESTED.inc(source="imap", outcome=outcome)
 
                     processed_emails.append(email_record)
 
                 except Exception as e:
+                    if savepoint.is_active:
+                        savepoint.rollback()
+                    if embedding_id:
+                        await self._discard_vectors([embedding_id])
                     logging.error(f"Error processing email {uid}: {str(e)}")
-                    continue
+                    metrics.EMAILS_INGESTED.inc(source="imap", outcome="failed")
+                finally:
+                    if progress:
+                        progress(index, len(messages))
+
+                if index % batch_size == 0:
+                    db.commit()
+                    added.clear()
+                    await self._discard_vectors(replaced)
+                    replaced.clear()
 
             db.commit()
+            added.clear()
+            await self._discard_vectors(replaced)
             server.logout()
-
-            if processed_emails:
-                logging.info(f"Successfully processed {len(processed_emails)} emails")
-            else:
-                logging.info("No emails to process")
-
-            return processed_emails
-
+        except TaskCancelled:
+            db.rollback()
+            await self._discard_vectors(added)
+            # Merges in the committed batches still need their relabels
+            await self._apply_relabels(db)
+            raise
         except Exception as e:
             db.rollback()
+            await self._discard_vectors(added)
             logging.error(f"Error in process_all_emails: {str(e)}")
             raise HTTPException(
                 status_code=500, detail=f"Error processing emails: {str(e)}"
             )
+
+        # The emails are committed; vector-side follow-ups can fail on their
+        # own and be repaired later (e.g. by a rebuild_reply_index task)
+        await self._apply_relabels(db)
+        if self.reply_index is not None:
+            try:
+                # New messages may answer (or be answered by) older ones
+                await self.reply_index.index_threads(
+                    db, {email.thread_id for email in processed_emails}
+                )
+            except Exception as e:
+                db.rollback()
+                logging.error(f"Error indexing reply pairs: {str(e)}")
+
+        if processed_emails:
+            logging.info(f"Successfully processed {len(processed_emails)} emails")
+        else:
+            logging.info("No emails to process")
+
+        return processed_emails
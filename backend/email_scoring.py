@@ -0,0 +1,250 @@
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session, aliased
+from models import Email, EmailClassification, EmailThread
+from vector_store import VectorStore
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Short descriptions embedded once per run; each counts as one labeled example
+CATEGORY_PROTOTYPES = {
+    "job_posting": "We are hiring. Job opening with requirements, responsibilities, salary and how to apply.",
+    "job_application": "I am interested in the position. Attached is my resume describing my experience and skills.",
+    "technical": "Technical discussion about code, bugs, APIs, deployment, machine learning models and infrastructure.",
+    "question": "Does anyone know how to do this? I have a question and would appreciate help or advice.",
+    "announcement": "Announcing an event, meetup, release or newsletter for everyone on the list.",
+}
+
+# Classifier results that double as category labels
+CLASSIFICATION_CATEGORIES = {
+    "job_posting": "job_posting",
+    "candidate_profile": "job_application",
+}
+
+# Weights of the importance features; they sum to 1
+IMPORTANCE_WEIGHTS = {
+    "thread_activity": 0.3,
+    "participants": 0.2,
+    "has_reply": 0.2,
+    "sender_rarity": 0.2,
+    "recency": 0.1,
+}
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class EmailScorer:
+    """Fills Email.category and Email.importance_score in batches.
+
+    Category is the nearest centroid (cosine) of labeled embeddings;
+    importance is a weighted mix of sender and thread features.
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        block_size: int = 1000,
+        min_category_similarity: float = 0.3,
+        recency_days: float = 30.0,
+    ):
+        self.vector_store = vector_store
+        self.block_size = block_size
+        self.min_category_similarity = min_category_similarity
+        self.recency_days = recency_days
+
+    def _embedding_ids(self, emails) -> List[Optional[str]]:
+        return [row.embedding_id or row.canonical_embedding_id for row in emails]
+
+    async def _vectors(
+        self, embedding_ids: List[Optional[str]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(mask of rows with a vector, normalized matrix of those vectors)"""
+        stored = await self.vector_store.get_embeddings(
+            list({embedding_id for embedding_id in embedding_ids if embedding_id})
+        )
+        mask = np.array([embedding_id in stored for embedding_id in embedding_ids])
+        if not mask.any():
+            return mask, np.empty((0, 0), dtype=np.float32)
+        matrix = np.asarray(
+            [
+                stored[embedding_id]
+                for embedding_id, has_vector in zip(embedding_ids, mask)
+                if has_vector
+            ],
+            dtype=np.float32,
+        )
+        return mask, _normalize(matrix)
+
+    async def build_centroids(self, db: Session) -> Tuple[List[str], np.ndarray]:
+        """Category names and their normalized centroid matrix"""
+        labeled: Dict[str, List[str]] = {}
+        rows = (
+            db.query(Email.embedding_id, EmailClassification.result)
+            .join(EmailClassification, EmailClassification.email_id == Email.id)
+            .filter(
+                EmailClassification.result.in_(CLASSIFICATION_CATEGORIES),
+                EmailClassification.confidence >= 0.7,
+                Email.embedding_id.isnot(None),
+            )
+        )
+        for embedding_id, result in rows:
+            category = CLASSIFICATION_CATEGORIES[result]
+            labeled.setdefault(category, []).append(embedding_id)
+
+        categories = sorted(set(CATEGORY_PROTOTYPES) | set(labeled))
+        prototypes = [c for c in categories if c in CATEGORY_PROTOTYPES]
+        prototype_vectors = dict(
+            zip(
+                prototypes,
+                await self.vector_store._get_embeddings(
+                    [CATEGORY_PROTOTYPES[c] for c in prototypes]
+                ),
+            )
+        )
+
+        centroids = []
+        for category in categories:
+            vectors = []
+            if category in prototype_vectors:
+                vectors.append(prototype_vectors[category])
+            stored = await self.vector_store.get_embeddings(labeled.get(category, []))
+            vectors.extend(stored.values())
+            centroid = _normalize(np.asarray(vectors, dtype=np.float32)).mean(axis=0)
+            centroids.append(centroid)
+        return categories, _normalize(np.vstack(centroids))
+
+    def _next_block(self, db: Session, after_id: int, full: bool):
+        canonical = aliased(Email)
+        query = (
+            db.query(
+                Email.id,
+                Email.embedding_id,
+                Email.sender,
+                Email.received_date,
+                canonical.embedding_id.label("canonical_embedding_id"),
+                EmailThread.email_count,
+                EmailThread.participant_count,
+            )
+            .outerjoin(canonical, canonical.id == Email.duplicate_of_id)
+            .outerjoin(EmailThread, EmailThread.thread_id == Email.thread_id)
+            .filter(Email.id > after_id)
+        )
+        if not full:
+            query = query.filter(Email.scored_at.is_(None))
+        return query.order_by(Email.id).limit(self.block_size).all()
+
+    def _importance(
+        self,
+        emails,
+        sender_counts: Dict[str, int],
+        replied: set,
+        max_thread: int,
+        max_sender: int,
+        now: datetime,
+    ) -> np.ndarray:
+        thread_sizes = np.array(
+            [row.email_count or 1 for row in emails], dtype=np.float32
+        )
+        participants = np.array(
+            [row.participant_count or 1 for row in emails], dtype=np.float32
+        )
+        senders = np.array(
+            [sender_counts.get(row.sender, 1) for row in emails], dtype=np.float32
+        )
+        ages = np.array(
+            [
+                (now - row.received_date).total_seconds() / 86400
+                if row.received_date
+                else self.recency_days * 10
+                for row in emails
+            ],
+            dtype=np.float32,
+        )
+        features = {
+            "thread_activity": np.log1p(thread_sizes) / np.log1p(max_thread),
+            "participants": np.minimum(participants / 5.0, 1.0),
+            "has_reply": np.array(
+                [row.id in replied for row in emails], dtype=np.float32
+            ),
+            # Mailing lists and bulk senders send most of the volume
+            "sender_rarity": 1.0 - np.log1p(senders) / np.log1p(max_sender),
+            "recency": np.exp(-np.maximum(ages, 0) / self.recency_days),
+        }
+        score = sum(
+            IMPORTANCE_WEIGHTS[name] * values for name, values in features.items()
+        )
+        return np.clip(score, 0.0, 1.0)
+
+    async def run(
+        self,
+        db: Session,
+        full: bool = False,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> Dict:
+        """Score unscored emails (or all with full=True) in blocks"""
+        categories, centroids = await self.build_centroids(db)
+        sender_counts = dict(
+            db.query(Email.sender, func.count(Email.id)).group_by(Email.sender).all()
+        )
+        # Floors keep the log ratios finite on tiny mailboxes
+        max_sender = max(max(sender_counts.values(), default=1), 2)
+        max_thread = max(db.query(func.max(EmailThread.email_count)).scalar() or 1, 2)
+        now = datetime.utcnow()
+
+        stats = {"emails_scored": 0, "categorized": 0}
+        last_id = 0
+        while True:
+            emails = self._next_block(db, last_id, full)
+            if not emails:
+                break
+            last_id = emails[-1].id
+            ids = [row.id for row in emails]
+
+            replied = {
+                parent_id
+                for (parent_id,) in db.query(Email.parent_id)
+                .filter(Email.parent_id.in_(ids))
+                .distinct()
+            }
+            importance = self._importance(
+                emails, sender_counts, replied, max_thread, max_sender, now
+            )
+
+            assigned: List[Optional[str]] = [None] * len(emails)
+            mask, matrix = await self._vectors(self._embedding_ids(emails))
+            if mask.any():
+                similarities = matrix @ centroids.T
+                best = similarities.argmax(axis=1)
+                best_scores = similarities[np.arange(len(best)), best]
+                positions = np.flatnonzero(mask)
+                for position, index, score in zip(positions, best, best_scores):
+                    if score >= self.min_category_similarity:
+                        assigned[position] = categories[index]
+                        stats["categorized"] += 1
+
+            # Executemany UPDATE keyed on the primary key
+            db.execute(
+                update(Email),
+                [
+                    {
+                        "id": email_id,
+                        "category": category or "other",
+                        "importance_score": float(score),
+                        "scored_at": now,
+                    }
+                    for email_id, category, score in zip(ids, assigned, importance)
+                ],
+            )
+            db.commit()
+            stats["emails_scored"] += len(emails)
+            if progress:
+                progress(stats["emails_scored"], None)
+
+        logger.info(f"Email scoring complete: {stats}")
+        return stats
@@ -0,0 +1,190 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from models import Email, EmailThread, MessageIndex
+import hashlib
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+_MESSAGE_ID = re.compile(r"<[^<>\s]+>")
+
+
+def parse_message_ids(value: Optional[str]) -> List[str]:
+    """All <message-id> tokens in a header value, in order"""
+    return _MESSAGE_ID.findall(value or "")
+
+
+def thread_headers(msg) -> Dict:
+    """Message-ID, In-Reply-To and References of a parsed email.message"""
+    own = parse_message_ids(msg.get("message-id", ""))
+    in_reply_to = parse_message_ids(msg.get("in-reply-to", ""))
+    return {
+        "message_id_header": own[0] if own else None,
+        "in_reply_to": in_reply_to[0] if in_reply_to else None,
+        "references": parse_message_ids(msg.get("references", "")),
+    }
+
+
+def new_thread_id(message_id: str) -> str:
+    return hashlib.md5(message_id.encode()).hexdigest()
+
+
+class ThreadingEngine:
+    """Threads mail by Message-ID/In-Reply-To/References.
+
+    message_index maps every message id seen (including ids only known from
+    References) to its thread, so finding a parent is one primary-key
+    lookup. When a message connects two threads the smaller is relabelled
+    into the larger (union by size).
+    """
+
+    def __init__(self, vector_store=None, reply_index=None):
+        # Chroma metadata carries thread_id, so merges must update it too
+        self.vector_store = vector_store
+        self.reply_index = reply_index
+
+    def _ensure_thread(
+        self, db: Session, thread_id: str, subject: str, received_date: datetime
+    ):
+        exists = (
+            db.query(EmailThread.id).filter(EmailThread.thread_id == thread_id).first()
+        )
+        if not exists:
+            db.add(
+                EmailThread(
+                    thread_id=thread_id, subject=subject, last_updated=received_date
+                )
+            )
+            db.flush()
+
+    def _merge(self, db: Session, thread_ids: List[str]) -> str:
+        """Fold all threads into the largest one and return its id"""
+        sizes = dict(
+            db.query(MessageIndex.thread_id, func.count(MessageIndex.message_id))
+            .filter(MessageIndex.thread_id.in_(thread_ids))
+            .group_by(MessageIndex.thread_id)
+            .all()
+        )
+        winner = max(
+            thread_ids, key=lambda thread_id: (sizes.get(thread_id, 0), thread_id)
+        )
+        losers = [thread_id for thread_id in thread_ids if thread_id != winner]
+
+        db.query(MessageIndex).filter(MessageIndex.thread_id.in_(losers)).update(
+            {MessageIndex.thread_id: winner}, synchronize_session="fetch"
+        )
+        # The per-row stats trigger would recount the winner for every
+        # moved email; recount once instead
+        db.execute(text("SELECT set_config('ebot.skip_thread_stats', 'on', true)"))
+        db.query(Email).filter(Email.thread_id.in_(losers)).update(
+            {Email.thread_id: winner}, synchronize_session="fetch"
+        )
+        db.execute(text("SELECT set_config('ebot.skip_thread_stats', 'off', true)"))
+        db.execute(
+            text("SELECT refresh_email_thread_stats(:thread_id)"), {"thread_id": winner}
+        )
+        db.query(EmailThread).filter(EmailThread.thread_id.in_(losers)).delete(
+            synchronize_session="fetch"
+        )
+
+        # Chroma isn't transactional: relabel only once this commits
+        db.info.setdefault("thread_relabels", []).append((losers, winner))
+        logger.info(f"Merged threads {losers} into {winner}")
+        return winner
+
+    def _relabel(self, losers: List[str], winner: str):
+        collections = []
+        if self.vector_store is not None:
+            collections.append(self.vector_store.collection)
+        if self.reply_index is not None:
+            collections.append(self.reply_index.collection)
+        for collection in collections:
+            results = collection.get(
+                where={"thread_id": {"$in": losers}}, include=["metadatas"]
+            )
+            if results["ids"]:
+                collection.update(
+                    ids=results["ids"],
+                    metadatas=[
+                        {**metadata, "thread_id": winner}
+                        for metadata in results["metadatas"]
+                    ],
+                )
+
+    async def apply_relabels(self, db: Session):
+        """Relabel Chroma metadata for merges committed on this session.
+
+        Call after db.commit(). Merges whose transaction rolled back still
+        have emails under the losing thread ids and are skipped.
+        """
+        for losers, winner in db.info.pop("thread_relabels", []):
+            rolled_back = (
+                db.query(Email.id).filter(Email.thread_id.in_(losers)).first()
+                is not None
+            )
+            if rolled_back:
+                continue
+            await asyncio.to_thread(self._relabel, losers, winner)
+
+    def assign(
+        self,
+        db: Session,
+        message_id: Optional[str],
+        in_reply_to: Optional[str],
+        references: List[str],
+        subject: str,
+        received_date: datetime,
+    ) -> str:
+        """Thread id for a new message; records its ids in message_index"""
+        related = [
+            ref for ref in references + [in_reply_to] if ref and ref != message_id
+        ]
+        known_ids = related + ([message_id] if message_id else [])
+        rows = (
+            db.query(MessageIndex).filter(MessageIndex.message_id.in_(known_ids)).all()
+            if known_ids
+            else []
+        )
+        thread_ids = sorted({row.thread_id for row in rows})
+
+        if not thread_ids:
+            thread_id = new_thread_id(message_id or f"{subject}|{received_date}")
+        elif len(thread_ids) == 1:
+            thread_id = thread_ids[0]
+        else:
+            thread_id = self._merge(db, thread_ids)
+
+        self._ensure_thread(db, thread_id, subject, received_date)
+
+        # Unseen ids become placeholders so later messages join this thread
+        seen = {row.message_id for row in rows}
+        for known_id in dict.fromkeys(known_ids):
+            if known_id not in seen:
+                db.add(MessageIndex(message_id=known_id, thread_id=thread_id))
+        db.flush()
+        return thread_id
+
+    def link(self, db: Session, email: Email, message_id: Optional[str]):
+        """Attach a stored email to its index row and fix up parent links"""
+        if message_id:
+            db.query(MessageIndex).filter(MessageIndex.message_id == message_id).update(
+                {MessageIndex.email_id: email.id}, synchronize_session=False
+            )
+            # Replies that arrived before this message
+            db.query(Email).filter(
+                Email.in_reply_to == message_id, Email.parent_id.is_(None)
+            ).update({Email.parent_id: email.id}, synchronize_session="fetch")
+
+        if email.in_reply_to and email.parent_id is None:
+            parent = (
+                db.query(MessageIndex.email_id)
+                .filter(MessageIndex.message_id == email.in_reply_to)
+                .scalar()
+            )
+            if parent:
+                email.parent_id = parent
+        db.flush()
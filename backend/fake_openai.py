@@ -0,0 +1,226 @@
+"""Deterministic stand-in for the OpenAI API, for benchmarks and offline runs.
+
+Embeddings are hashed bags of words, so texts that share vocabulary get
+nearby vectors and retrieval behaves roughly like the real thing. Chat
+completions return JSON in the shape each prompt in this codebase asks
+for, with scores derived from a hash of the prompt.
+"""
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Union
+import asyncio
+import hashlib
+import json
+import math
+import re
+import time
+
+from openai_client import ModelStats
+import metrics
+
+EMBEDDING_DIMENSIONS = 1536
+
+_WORD = re.compile(r"\w+")
+_INDEX = re.compile(r'"index":\s*(\d+)')
+
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def _unit(text: str, salt: str = "") -> float:
+    """Stable pseudo-random number in [0, 1) for a piece of text"""
+    return _hash(salt + text) / 2**64
+
+
+def count_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> List[float]:
+    """Unit-length signed feature hash of the lower-cased words"""
+    vector = [0.0] * dimensions
+    for word in _WORD.findall(text.lower()):
+        value = _hash(word)
+        vector[value % dimensions] += 1.0 if value & (1 << 63) else -1.0
+    norm = math.sqrt(sum(x * x for x in vector))
+    if not norm:
+        vector[_hash(text) % dimensions] = norm = 1.0
+    return [x / norm for x in vector]
+
+
+def _classification(prompt: str) -> Dict:
+    subject = re.search(r"Email Subject: (.*)", prompt)
+    text = prompt.lower()
+    if any(word in text for word in ("hiring", "job opening", "we are looking for")):
+        kind = "job_posting"
+        info = {
+            "title": (subject.group(1).strip() if subject else "") or "Engineer",
+            "company": "Example Corp",
+            "location": "Remote",
+            "requirements": "Python, SQL",
+            "salary_range": None,
+        }
+    elif any(word in text for word in ("resume", "my experience", "open to work")):
+        kind = "candidate_profile"
+        info = {
+            "name": "Candidate",
+            "skills": "Python, SQL",
+            "experience": "3 years",
+            "preferred_location": "Remote",
+        }
+    else:
+        kind, info = "other", {}
+    confidence = round(0.6 + 0.4 * _unit(prompt, "confidence"), 2)
+    return {"type": kind, "confidence": confidence, "extracted_info": info}
+
+
+def _match(prompt: str, index: Optional[int] = None) -> Dict:
+    salt = "match" if index is None else f"match{index}"
+    score = round(_unit(prompt, salt), 2)
+    result = {
+        "match_score": score,
+        "analysis": f"Deterministic analysis with score {score}.",
+        "key_matches": ["skills"] if score >= 0.5 else [],
+        "gaps": [] if score >= 0.5 else ["experience"],
+    }
+    if index is not None:
+        result["index"] = index
+    return result
+
+
+def fake_chat_content(messages: List[Dict]) -> str:
+    """JSON reply matching the format requested by the last user message"""
+    prompt = str(messages[-1].get("content") or "") if messages else ""
+    if "show_best_match" in prompt:
+        reply = {
+            "show_best_match": _unit(prompt, "best") >= 0.3,
+            "overall_analysis": "Deterministic similarity analysis.",
+        }
+    elif '"matches": [' in prompt:
+        pairs = sorted({int(index) for index in _INDEX.findall(prompt)})
+        reply = {"matches": [_match(prompt, index) for index in pairs]}
+    elif "match_score" in prompt:
+        reply = _match(prompt)
+    elif "job posting or a candidate profile" in prompt:
+        reply = _classification(prompt)
+    else:
+        reply = {"response": "ok"}
+    return json.dumps(reply)
+
+
+def embeddings_response(
+    inputs: Union[str, List[str]], model: str, dimensions: Optional[int] = None
+) -> Dict:
+    """Body of a /v1/embeddings response"""
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    dimensions = dimensions or EMBEDDING_DIMENSIONS
+    tokens = sum(count_tokens(text) for text in inputs)
+    return {
+        "object": "list",
+        "data": [
+            {
+                "object": "embedding",
+                "index": index,
+                "embedding": fake_embedding(text, dimensions),
+            }
+            for index, text in enumerate(inputs)
+        ],
+        "model": model,
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+def chat_response(messages: List[Dict], model: str) -> Dict:
+    """Body of a /v1/chat/completions response"""
+    content = fake_chat_content(messages)
+    prompt_tokens = sum(
+        count_tokens(str(message.get("content") or "")) for message in messages
+    )
+    completion_tokens = count_tokens(content)
+    return {
+        "id": f"chatcmpl-{_hash(content) & 0xFFFFFFFFFFFF:012x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _namespace(value):
+    """JSON body -> attribute access, like the SDK's response models"""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_namespace(item) for item in value]
+    return value
+
+
+class _Endpoint:
+    def __init__(self, client: "FakeOpenAI", path: str):
+        self._client = client
+        self._path = path
+
+    async def create(self, **kwargs):
+        return await self._client._call(self._path, **kwargs)
+
+
+class _Chat:
+    def __init__(self, client: "FakeOpenAI"):
+        self.completions = _Endpoint(client, "chat.completions")
+
+
+class FakeOpenAI:
+    """In-process drop-in for RateLimitedOpenAI; never touches the network"""
+
+    def __init__(self, latency_seconds: float = 0.0):
+        # Optional fixed delay per call to approximate API round trips
+        self.latency_seconds = latency_seconds
+        self.model_stats: Dict[str, ModelStats] = {}
+        self.chat = _Chat(self)
+        self.embeddings = _Endpoint(self, "embeddings")
+
+    async def _call(self, path: str, **kwargs):
+        model = kwargs.get("model", "")
+        stats = self.model_stats.setdefault(model, ModelStats())
+        started = time.perf_counter()
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+
+        if path == "chat.completions":
+            body = chat_response(kwargs.get("messages", []), model)
+        else:
+            body = embeddings_response(
+                kwargs.get("input", ""), model, kwargs.get("dimensions")
+            )
+
+        latency = time.perf_counter() - started
+        histogram = (
+            metrics.LLM_LATENCY
+            if path == "chat.completions"
+            else metrics.EMBEDDING_LATENCY
+        )
+        histogram.observe(latency, model=model)
+        stats.calls += 1
+        stats.total_latency += latency
+        stats.max_latency = max(stats.max_latency, latency)
+        stats.prompt_tokens += body["usage"]["prompt_tokens"]
+        stats.completion_tokens += body["usage"].get("completion_tokens", 0)
+        return _namespace(body)
+
+    def stats(self) -> Dict:
+        return {model: stats.as_dict() for model, stats in self.model_stats.items()}
+
+    async def close(self):
+        pass
@@ -0,0 +1,89 @@
+"""Checks cold import time of the API and CLI entry points.
+
+Runs each module in a fresh interpreter with ``python -X importtime`` and
+reports the total plus the slowest imports. Exits non-zero when a module
+exceeds its budget, so it can run in CI.
+
+Usage: python import_budget.py [--top 15] [--budget-ms main=1500 ...]
+"""
+from typing import Dict, List, Tuple
+import argparse
+import subprocess
+import sys
+
+# Cumulative import time budgets in milliseconds
+DEFAULT_BUDGETS_MS = {
+    "main": 1500,
+    "task_worker": 1000,
+    "reset_db": 600,
+    "import_mbox": 800,
+}
+
+# Imports that should never be paid for at startup
+HEAVY_MODULES = ("chromadb", "openai", "numpy", "bs4", "imapclient")
+
+
+def measure(module: str) -> List[Tuple[str, float, float]]:
+    """(module, self ms, cumulative ms) for every import made by `module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        tail = result.stderr.strip().splitlines()[-1:] or ["unknown error"]
+        raise RuntimeError(f"import {module} failed: {tail[0]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append(
+            (name.rstrip(), int(self_us) / 1000, int(cumulative_us) / 1000)
+        )
+    return imports
+
+
+def report(module: str, budget_ms: float, top: int) -> bool:
+    imports = measure(module)
+    # The target module is the last one to finish importing
+    total_ms = imports[-1][2] if imports else 0.0
+    ok = total_ms <= budget_ms
+    print(f"{module}: {total_ms:.0f} ms (budget {budget_ms:.0f} ms) {'OK' if ok else 'OVER'}")
+
+    loaded = {name.strip().split(".")[0] for name, _, _ in imports}
+    eager = [name for name in HEAVY_MODULES if name in loaded]
+    if eager:
+        print(f"  eagerly imported: {', '.join(eager)}")
+
+    for name, self_ms, cumulative_ms in sorted(imports, key=lambda i: -i[2])[:top]:
+        print(f"  {cumulative_ms:8.1f} ms cumulative {self_ms:8.1f} ms self  {name}")
+    return ok
+
+
+def parse_budgets(values: List[str]) -> Dict[str, float]:
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    for value in values:
+        module, _, ms = value.partition("=")
+        budgets[module] = float(ms)
+    return budgets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report slowest imports per entry point")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--budget-ms",
+        nargs="*",
+        default=[],
+        metavar="MODULE=MS",
+        help="override or add a module budget",
+    )
+    args = parser.parse_args()
+
+    results = [
+        report(module, budget, args.top)
+        for module, budget in parse_budgets(args.budget_ms).items()
+    ]
+    sys.exit(0 if all(results) else 1)
@@ -1,24 +1,21 @@
 import mailbox
 import email
 from email.header import decode_header
-from bs4 import BeautifulSoup
 from datetime import datetime
 import hashlib
 import asyncio
 from sqlalchemy.orm import Session
 from database import SessionLocal, init_db
-from models import Email, EmailThread
-from vector_store import VectorStore
-from config import Settings
+from models import Email
+from services import Services, services
+from email_threading import thread_headers
+import metrics
 import email.utils
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-settings = Settings()
-vector_store = VectorStore(settings)
-
 
 def decode_header_value(value):
     """Safely decode email header values"""
@@ -78,16 +75,17 @@ def parse_email_message(msg):
 
         if html_content:
             # Extract text from HTML
+            from bs4 import BeautifulSoup
+
             soup = BeautifulSoup(html_content, "html.parser")
             if not content:  # Only use HTML content if we don't have plain text
                 content = soup.get_text(separator=" ", strip=True)
 
-        # Generate thread ID based on normalized subject
-        clean_subject = "".join(e for e in subject if e.isalnum()).lower()
-        thread_id = hashlib.md5(clean_subject.encode()).hexdigest()
+        # Threading uses Message-ID/In-Reply-To/References (see email_threading)
+        headers = thread_headers(msg)
 
         # Generate message ID if not present
-        message_id = msg.get("message-id", "")
+        message_id = headers["message_id_header"]
         if not message_id:
             message_id = f"<{hashlib.md5(content.encode()).hexdigest()}@generated>"
 
@@ -98,43 +96,61 @@ def parse_email_message(msg):
             "content": content or "No content",
             "html_content": html_content,
             "received_date": received_date,
-            "thread_id": thread_id,
+            **headers,
         }
     except Exception as e:
         logger.error(f"Error parsing email: {str(e)}")
         return None
 
 
-async def process_email(email_data: dict, db: Session):
-    """Process a single email and add it to the database"""
+async def process_email(
+    email_data: dict, db: Session, container: Services = services
+):
+    """Process a single email and add it to the database.
+
+    Runs in a savepoint, so a failed email is rolled back (and its vector
+    deleted) without breaking the caller's session.
+    """
+    savepoint = db.begin_nested()
+    embedding_id = None
     try:
-        # Create embedding
-        embedding_id = await vector_store.add_text(
-            email_data["content"],
-            metadata={
-                "subject": email_data["subject"],
-                "thread_id": email_data["thread_id"],
-            },
+        # Thread from reply headers before embedding, which stores thread_id
+        threading_engine = container.threading_engine
+        email_data["thread_id"] = threading_engine.assign(
+            db,
+            email_data["message_id"],
+            email_data["in_reply_to"],
+            email_data["references"],
+            email_data["subject"],
+            email_data["received_date"],
         )
 
-        # Create or update thread
-        thread = (
-            db.query(EmailThread)
-            .filter(EmailThread.thread_id == email_data["thread_id"])
-            .first()
-        )
+        # Cross-posts and forwards link to the stored copy instead of re-embedding
+        near_duplicates = container.near_duplicates
+        signature = duplicate_of_id = None
+        if near_duplicates is not None:
+            signature = near_duplicates.signature(email_data["content"])
+            match = (
+                near_duplicates.find_duplicate(db, signature)
+                if signature is not None
+                else None
+            )
+            if match:
+                duplicate_of_id = match[0]
+                logger.info(
+                    f"Email {email_data['message_id']} is a near-duplicate of "
+                    f"email {duplicate_of_id} ({match[1]:.2f})"
+                )
 
-        if not thread:
-            thread = EmailThread(
-                thread_id=email_data["thread_id"],
-                subject=email_data["subject"],
-                last_updated=email_data["received_date"],
+        # Create embedding
+        if duplicate_of_id is None:
+            embedding_id = await container.vector_store.add_text(
+                email_data["content"],
+                metadata={
+                    "subject": email_data["subject"],
+                    "thread_id": email_data["thread_id"],
+                },
             )
-            db.add(thread)
-            db.flush()
-        else:
-            thread.last_updated = email_data["received_date"]
-            thread.email_count += 1
 
         # Create email record
         email_record = Email(
@@ -146,15 +162,33 @@ async def process_email(email_data: dict, db: Session):
             html_content=email_data["html_content"],
             received_date=email_data["received_date"],
             thread_id=email_data["thread_id"],
+            in_reply_to=email_data["in_reply_to"],
             embedding_id=embedding_id,
+            duplicate_of_id=duplicate_of_id,
             is_processed=True,
         )
 
         db.add(email_record)
+        # Thread stats are maintained by a DB trigger
+        db.flush()
+        threading_engine.link(db, email_record, email_data["message_id"])
+        if signature is not None:
+            near_duplicates.add(db, email_record, signature)
+        savepoint.commit()
+        metrics.EMAILS_INGESTED.inc(
+            source="mbox", outcome="duplicate" if duplicate_of_id else "new"
+        )
         return email_record
 
     except Exception as e:
+        if savepoint.is_active:
+            savepoint.rollback()
+        if embedding_id:
+            await asyncio.to_thread(
+                container.vector_store.collection.delete, ids=[embedding_id]
+            )
         logger.error(f"Error processing email: {str(e)}")
+        metrics.EMAILS_INGESTED.inc(source="mbox", outcome="failed")
         return None
 
 
@@ -178,6 +212,8 @@ async def import_mbox(mbox_path: str, limit: int = 300):
 
         try:
             processed_count = 0
+            touched_threads = set()
+            added = []  # vectors of emails not committed yet
             for i in range(start_index, total_messages):
                 message = mbox[i]
 
@@ -203,15 +239,29 @@ async def import_mbox(mbox_path: str, limit: int = 300):
                 email_record = await process_email(email_data, db)
                 if email_record:
                     processed_count += 1
+                    touched_threads.add(email_record.thread_id)
+                    if email_record.embedding_id:
+                        added.append(email_record.embedding_id)
                     if processed_count % 10 == 0:
                         logger.info(f"Processed {processed_count} emails")
                         db.commit()  # Commit every 10 emails
+                        added.clear()
+                        await services.threading_engine.apply_relabels(db)
 
             db.commit()
+            added.clear()
+            await services.threading_engine.apply_relabels(db)
             logger.info(f"Successfully imported {processed_count} emails")
 
+            pairs = await services.reply_index.index_threads(db, touched_threads)
+            logger.info(f"Indexed {pairs} question/reply pairs")
+
         except Exception as e:
             db.rollback()
+            if added:
+                await asyncio.to_thread(
+                    services.vector_store.collection.delete, ids=added
+                )
             logger.error(f"Error during import: {str(e)}")
             raise
         finally:
@@ -0,0 +1,366 @@
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from sqlalchemy.orm import Session, selectinload
+from models import Email, EmailClassification, JobPosting, Candidate
+from vector_store import VectorStore
+from email_prefilter import EmailPrefilter, PREFILTER_VERSION
+from job_rules import extract_job_fields, RULES_VERSION
+from job_matcher import job_metadata, candidate_metadata
+from openai_client import RateLimitedOpenAI
+from sqlalchemy import or_
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLASSIFIER_MODEL = "gpt-4o-mini"
+CLASSIFIER_VERSION = f"{CLASSIFIER_MODEL}/job-classify-v1"
+
+
+class JobExtractor:
+    """Classifies emails and turns job postings and candidate profiles into rows"""
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        openai_client: RateLimitedOpenAI,
+        max_concurrency: int = 5,
+        batch_size: int = 100,
+        prefilter: Optional[EmailPrefilter] = None,
+        rules_min_confidence: float = 0.8,
+    ):
+        self.vector_store = vector_store
+        self.openai_client = openai_client
+        self.batch_size = batch_size
+        self.prefilter = prefilter
+        # Rule-extracted postings at or above this confidence skip the LLM
+        self.rules_min_confidence = rules_min_confidence
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _classify(self, email: Email) -> Optional[Dict]:
+        """Use OpenAI to classify the email and extract structured information"""
+        prompt = f"""Analyze this email and determine if it's a job posting or a candidate profile.
+                Then extract relevant information in JSON format.
+
+                Email Subject: {email.subject}
+                Email Content: {email.content}
+
+                Respond in this JSON format:
+                {{
+                    "type": "job_posting" or "candidate_profile" or "other",
+                    "confidence": 0.0 to 1.0,
+                    "extracted_info": {{
+                        // For job_posting:
+                        "title": "extracted job title",
+                        "company": "company name",
+                        "location": "job location",
+                        "requirements": "list of requirements",
+                        "salary_range": "salary range if mentioned",
+
+                        // For candidate_profile:
+                        "name": "candidate name",
+                        "skills": "extracted skills",
+                        "experience": "extracted experience",
+                        "preferred_location": "preferred location if mentioned"
+                    }}
+                }}"""
+
+        try:
+            async with self.semaphore:
+                response = await self.openai_client.chat.completions.create(
+                    model=CLASSIFIER_MODEL,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "You are an expert at analyzing emails and extracting job-related information.",
+                        },
+                        {"role": "user", "content": prompt},
+                    ],
+                    temperature=0.3,
+                    response_format={"type": "json_object"},
+                )
+            return json.loads(response.choices[0].message.content)
+        except Exception as e:
+            # Left unclassified so the next refresh retries it
+            logger.error(f"Error classifying email {email.id}: {str(e)}")
+            return None
+
+    async def _create_job(
+        self, db: Session, email: Email, info: Dict, added: List[str]
+    ) -> bool:
+        """Create a job posting from extracted info unless it already exists"""
+        existing_job = (
+            db.query(JobPosting)
+            .filter(
+                JobPosting.title == info["title"],
+                JobPosting.company == info.get("company"),
+                JobPosting.source_email_id == email.id,
+            )
+            .first()
+        )
+        if existing_job:
+            return False
+
+        job = JobPosting(
+            title=info["title"],
+            company=info.get("company"),
+            description=email.content,
+            requirements=info.get("requirements", ""),
+            location=info.get("location", ""),
+            salary_range=info.get("salary_range"),
+            status="active",
+            source_email_id=email.id,
+        )
+        db.add(job)
+        db.flush()
+
+        # Create embedding for job
+        job_text = f"{job.title} {job.description} {job.requirements}"
+        job.embedding_id = await self.vector_store.add_text(
+            job_text, metadata=job_metadata(job)
+        )
+        added.append(job.embedding_id)
+        return True
+
+    async def _create_candidate(
+        self, db: Session, email: Email, info: Dict, added: List[str]
+    ) -> bool:
+        """Create a candidate profile from extracted info unless one exists"""
+        existing_candidate = (
+            db.query(Candidate).filter(Candidate.email == email.sender).first()
+        )
+        if existing_candidate:
+            return False
+
+        candidate = Candidate(
+            name=info["name"],
+            email=email.sender,
+            resume_text=email.content,
+            skills=info["skills"],
+            experience=info["experience"],
+            preferred_location=info.get("preferred_location"),
+        )
+        db.add(candidate)
+        db.flush()
+
+        # Create embedding for candidate
+        candidate_text = (
+            f"{candidate.skills} {candidate.experience} {candidate.resume_text}"
+        )
+        candidate.embedding_id = await self.vector_store.add_text(
+            candidate_text, metadata=candidate_metadata(candidate)
+        )
+        added.append(candidate.embedding_id)
+        return True
+
+    def _next_batch(
+        self, db: Session, after_id: int, recheck_prefiltered: bool = False
+    ) -> List[Email]:
+        """Next batch of emails that still need classification, by id"""
+        pending = EmailClassification.id.is_(None)
+        if recheck_prefiltered:
+            # e.g. after lowering the prefilter threshold
+            pending = or_(pending, EmailClassification.model_version == PREFILTER_VERSION)
+        return (
+            db.query(Email)
+            .outerjoin(EmailClassification, EmailClassification.email_id == Email.id)
+            .filter(pending, Email.id > after_id)
+            .options(selectinload(Email.body), selectinload(Email.classification))
+            .order_by(Email.id)
+            .limit(self.batch_size)
+            .all()
+        )
+
+    async def refresh(
+        self,
+        db: Session,
+        recheck_prefiltered: bool = False,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> Dict:
+        """Classify new emails and create jobs/candidates from them"""
+        stats = {
+            "emails_processed": 0,
+            "llm_calls_skipped": 0,
+            "rule_extractions": 0,
+            "classification_failures": 0,
+            "jobs_created": 0,
+            "candidates_created": 0,
+        }
+
+        last_id = 0
+        while True:
+            emails = self._next_batch(db, last_id, recheck_prefiltered)
+            if not emails:
+                break
+            last_id = emails[-1].id
+
+            # Emails the local prefilter rules out never reach the LLM
+            to_classify = []
+            prefilter_scores: Dict[int, float] = {}
+            for email in emails:
+                if self.prefilter is None:
+                    to_classify.append(email)
+                    continue
+                needs_llm, score = self.prefilter.needs_llm(email.subject, email.content)
+                prefilter_scores[email.id] = score
+                if needs_llm:
+                    to_classify.append(email)
+                else:
+                    self._record(
+                        db,
+                        email,
+                        "other",
+                        None,
+                        PREFILTER_VERSION,
+                        {"prefilter_score": score},
+                        score,
+                    )
+                    stats["llm_calls_skipped"] += 1
+                    stats["emails_processed"] += 1
+
+            # Well-formatted postings are extracted by rules at parse speed
+            to_llm = []
+            for email in to_classify:
+                fields, confidence = extract_job_fields(
+                    email.subject, email.content, email.sender
+                )
+                if confidence < self.rules_min_confidence:
+                    to_llm.append(email)
+                    continue
+                try:
+                    async with self._savepoint(db) as added:
+                        if await self._create_job(db, email, fields, added):
+                            stats["jobs_created"] += 1
+                        self._record(
+                            db,
+                            email,
+                            "job_posting",
+                            confidence,
+                            RULES_VERSION,
+                            fields,
+                            prefilter_scores.get(email.id),
+                        )
+                except Exception as email_error:
+                    logger.error(
+                        f"Rule extraction failed for email {email.id}: "
+                        f"{str(email_error)}"
+                    )
+                    to_llm.append(email)
+                    continue
+                stats["rule_extractions"] += 1
+                stats["emails_processed"] += 1
+
+            # LLM calls run concurrently; DB writes stay on this session in order
+            to_classify = to_llm
+            results = await asyncio.gather(
+                *(self._classify(email) for email in to_classify)
+            )
+
+            for email, result in zip(to_classify, results):
+                if result is None:
+                    stats["classification_failures"] += 1
+                    continue
+                try:
+                    # Savepoint per email so one bad result doesn't lose the batch
+                    async with self._savepoint(db) as added:
+                        await self._apply(
+                            db,
+                            email,
+                            result,
+                            stats,
+                            added,
+                            prefilter_scores.get(email.id),
+                        )
+                except Exception as email_error:
+                    logger.error(
+                        f"Error processing email {email.id}: {str(email_error)}"
+                    )
+                    # Recorded outside the savepoint so the paid call isn't
+                    # repeated on every refresh
+                    self._record(
+                        db,
+                        email,
+                        "error",
+                        None,
+                        CLASSIFIER_VERSION,
+                        {"error": str(email_error)},
+                        prefilter_scores.get(email.id),
+                    )
+                    stats["classification_failures"] += 1
+                    continue
+                stats["emails_processed"] += 1
+
+            db.commit()
+            if progress:
+                progress(stats["emails_processed"], None)
+
+        return stats
+
+    @asynccontextmanager
+    async def _savepoint(self, db: Session):
+        """Savepoint that also removes vectors added inside it on rollback"""
+        savepoint = db.begin_nested()
+        added: List[str] = []
+        try:
+            yield added
+            savepoint.commit()
+        except Exception:
+            if savepoint.is_active:
+                savepoint.rollback()
+            if added:
+                await asyncio.to_thread(self.vector_store.collection.delete, ids=added)
+            raise
+
+    async def _apply(
+        self,
+        db: Session,
+        email: Email,
+        result: Dict,
+        stats: Dict,
+        added: List[str],
+        prefilter_score: Optional[float] = None,
+    ):
+        """Record a classification and create the job or candidate it describes"""
+        info = result.get("extracted_info") or {}
+        confidence = float(result.get("confidence") or 0.0)
+
+        if result.get("type") == "job_posting" and confidence > 0.7:
+            if await self._create_job(db, email, info, added):
+                stats["jobs_created"] += 1
+        elif result.get("type") == "candidate_profile" and confidence > 0.7:
+            if await self._create_candidate(db, email, info, added):
+                stats["candidates_created"] += 1
+
+        self._record(
+            db,
+            email,
+            result.get("type", "other"),
+            confidence,
+            CLASSIFIER_VERSION,
+            info,
+            prefilter_score,
+        )
+
+    def _record(
+        self,
+        db: Session,
+        email: Email,
+        result: str,
+        confidence: Optional[float],
+        model_version: str,
+        info: Dict,
+        prefilter_score: Optional[float] = None,
+    ):
+        """Create or update the classification row for an email"""
+        classification = email.classification
+        if classification is None:
+            classification = EmailClassification(email_id=email.id)
+            db.add(classification)
+        classification.result = result
+        classification.confidence = confidence
+        classification.model_version = model_version
+        classification.extracted_info = json.dumps(info)
+        classification.prefilter_score = prefilter_score
+        classification.classified_at = datetime.utcnow()
@@ -1,15 +1,136 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
 from models import JobPosting, Candidate, Match
 from vector_store import VectorStore
-from openai import AsyncOpenAI
+from job_rules import parse_salary_range
+from openai_client import RateLimitedOpenAI
+import asyncio
+import hashlib
 import json
+import re
+
+
+def normalize_location(location: Optional[str]) -> Optional[str]:
+    """Comparable location key: "remote" or the lowercased city part"""
+    if not location or not location.strip():
+        return None
+    if re.search(r"\bremote\b", location, re.I):
+        return "remote"
+    return " ".join(location.split(",")[0].lower().split()) or None
+
+
+def job_metadata(job: JobPosting) -> Dict:
+    """Vector metadata for a job, including the fields matching filters on"""
+    metadata = {
+        "type": "job",
+        "embedding_id": f"job_{job.id}",
+        "job_id": job.id,
+        "status": job.status or "active",
+    }
+    location = normalize_location(job.location)
+    if location:
+        metadata["location"] = location
+    salary_min, salary_max = parse_salary_range(job.salary_range)
+    # Chroma metadata cannot hold None, so unknown bounds are left out
+    if salary_min is not None:
+        metadata["salary_min"] = salary_min
+        metadata["salary_max"] = salary_max
+    return metadata
+
+
+def candidate_metadata(candidate: Candidate) -> Dict:
+    """Vector metadata for a candidate"""
+    metadata = {
+        "type": "candidate",
+        "embedding_id": f"candidate_{candidate.id}",
+        "candidate_id": candidate.id,
+    }
+    location = normalize_location(candidate.preferred_location)
+    if location:
+        metadata["location"] = location
+    return metadata
+
+
+def build_where(
+    kind: str,
+    status: Optional[str] = None,
+    location: Optional[str] = None,
+    include_remote: bool = True,
+    min_salary: Optional[float] = None,
+    max_salary: Optional[float] = None,
+) -> Dict:
+    """Chroma where-filter applying the matching pre-filters"""
+    conditions: List[Dict] = [{"type": kind}]
+    if status:
+        conditions.append({"status": status})
+    location_key = normalize_location(location)
+    if location_key:
+        if include_remote and location_key != "remote":
+            conditions.append({"location": {"$in": [location_key, "remote"]}})
+        else:
+            conditions.append({"location": location_key})
+    # Salary filters only keep vectors with known bounds that overlap the range
+    if min_salary is not None:
+        conditions.append({"salary_max": {"$gte": min_salary}})
+    if max_salary is not None:
+        conditions.append({"salary_min": {"$lte": max_salary}})
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def record_id_from_metadata(metadata: Dict, kind: str) -> Optional[int]:
+    """Primary key of the job/candidate a vector belongs to"""
+    if metadata.get(f"{kind}_id") is not None:
+        return int(metadata[f"{kind}_id"])
+    # Older vectors only carry "job_<id>" / "candidate_<id>"
+    value = str(metadata.get("embedding_id", ""))
+    prefix = f"{kind}_"
+    if value.startswith(prefix) and value[len(prefix):].isdigit():
+        return int(value[len(prefix):])
+    return None
+
+
+def job_content_hash(job: JobPosting) -> str:
+    """Hash of the job fields the match analysis is based on"""
+    text = "\x1f".join(
+        str(value or "")
+        for value in (
+            job.title,
+            job.company,
+            job.description,
+            job.requirements,
+            job.location,
+        )
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def candidate_content_hash(candidate: Candidate) -> str:
+    """Hash of the candidate fields the match analysis is based on"""
+    text = "\x1f".join(
+        str(value or "")
+        for value in (
+            candidate.skills,
+            candidate.experience,
+            candidate.preferred_location,
+            candidate.resume_text,
+        )
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
 class JobMatcher:
-    def __init__(self, vector_store: VectorStore, openai_client: AsyncOpenAI):
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        openai_client: RateLimitedOpenAI,
+        max_concurrency: int = 5,
+        batch_analysis: bool = False,
+    ):
         self.vector_store = vector_store
         self.openai_client = openai_client
+        self.batch_analysis = batch_analysis
+        # Caps in-flight match analyses across all requests
+        self.semaphore = asyncio.Semaphore(max_concurrency)
 
     async def _analyze_match(self, job: JobPosting, candidate: Candidate) -> Dict:
         """Use LLM to analyze the match between a job and candidate"""
@@ -59,67 +180,238 @@ Provide your analysis in the following JSON format:
                 "analysis": f"Error in analysis: {str(e)}",
                 "key_matches": [],
                 "gaps": [],
+                "error": True,
             }
 
-    async def find_matching_candidates(
-        self, job: JobPosting, db: Session, limit: int = 5
+    async def _analyze_match_limited(
+        self, job: JobPosting, candidate: Candidate
+    ) -> Dict:
+        async with self.semaphore:
+            return await self._analyze_match(job, candidate)
+
+    async def _analyze_match_batch(
+        self, pairs: List[Tuple[JobPosting, Candidate]]
+    ) -> List[Optional[Dict]]:
+        """Score several job/candidate pairs in a single LLM call"""
+        try:
+            prompt = f"""Analyze each of the following job posting and candidate pairs independently.
+
+Pairs:
+{json.dumps([{
+    "index": idx,
+    "job": {
+        "title": job.title,
+        "company": job.company,
+        "description": job.description,
+        "requirements": job.requirements,
+        "location": job.location,
+    },
+    "candidate": {
+        "skills": candidate.skills,
+        "experience": candidate.experience,
+        "preferred_location": candidate.preferred_location,
+        "resume": candidate.resume_text,
+    },
+} for idx, (job, candidate) in enumerate(pairs)], indent=2)}
+
+Provide your analysis in the following JSON format, with one entry per pair:
+{{
+    "matches": [
+        {{
+            "index": 0,
+            "match_score": 0.0 to 1.0,
+            "analysis": "Detailed explanation of the match...",
+            "key_matches": ["List of key matching points"],
+            "gaps": ["List of potential gaps or mismatches"]
+        }}
+    ]
+}}"""
+
+            async with self.semaphore:
+                response = await self.openai_client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "You are an expert job matcher. Analyze the match between jobs and candidates.",
+                        },
+                        {"role": "user", "content": prompt},
+                    ],
+                    temperature=0.3,
+                    response_format={"type": "json_object"},
+                )
+
+            results: List[Optional[Dict]] = [None] * len(pairs)
+            for item in json.loads(response.choices[0].message.content).get(
+                "matches", []
+            ):
+                idx = item.get("index")
+                if isinstance(idx, int) and 0 <= idx < len(pairs):
+                    results[idx] = {
+                        "match_score": item.get("match_score", 0.0),
+                        "analysis": item.get("analysis", ""),
+                        "key_matches": item.get("key_matches", []),
+                        "gaps": item.get("gaps", []),
+                    }
+            return results
+
+        except Exception as e:
+            print(f"Error in batch match analysis: {str(e)}")
+            return [None] * len(pairs)
+
+    async def _analyze_matches(
+        self, pairs: List[Tuple[JobPosting, Candidate]]
     ) -> List[Dict]:
-        """Find and analyze matching candidates for a job posting"""
-        # Get job embedding
-        job_embedding = await self.vector_store._get_embedding(
-            f"{job.title} {job.description} {job.requirements}"
-        )
+        """Analyze pairs concurrently, or in one call when batch analysis is on"""
+        results: List[Optional[Dict]] = [None] * len(pairs)
+        if self.batch_analysis and len(pairs) > 1:
+            results = await self._analyze_match_batch(pairs)
 
-        # Search for candidates
-        results = self.vector_store.collection.query(
-            query_embeddings=[job_embedding],
-            n_results=limit,
-            where={"type": "candidate"},  # Filter for candidate embeddings
-            include=["documents", "metadatas", "distances"],
+        # Anything the batch call did not cover is analyzed individually
+        missing = [idx for idx, result in enumerate(results) if result is None]
+        analyses = await asyncio.gather(
+            *(self._analyze_match_limited(*pairs[idx]) for idx in missing)
         )
+        for idx, analysis in zip(missing, analyses):
+            results[idx] = analysis
+        return results
 
-        matches = []
-        for doc, metadata, distance in zip(
-            results["documents"][0],
-            results["metadatas"][0],
-            results["distances"][0],
-        ):
-            candidate = (
-                db.query(Candidate)
-                .filter(Candidate.embedding_id == metadata["embedding_id"])
-                .first()
+    async def _get_analyses(
+        self,
+        db: Session,
+        pairs: List[Tuple[JobPosting, Candidate]],
+        refresh: bool = False,
+    ) -> List[Dict]:
+        """Return analyses for pairs, reusing stored ones whose inputs are unchanged"""
+        if not pairs:
+            return []
+
+        job_ids = {job.id for job, _ in pairs}
+        candidate_ids = {candidate.id for _, candidate in pairs}
+        stored = {
+            (match.job_id, match.candidate_id): match
+            for match in db.query(Match).filter(
+                Match.job_id.in_(job_ids), Match.candidate_id.in_(candidate_ids)
             )
-            if not candidate:
-                continue
+        }
 
-            # Calculate initial similarity score
-            similarity_score = 1 - distance
+        results: List[Optional[Dict]] = []
+        hashes = []
+        for job, candidate in pairs:
+            job_hash = job_content_hash(job)
+            candidate_hash = candidate_content_hash(candidate)
+            hashes.append((job_hash, candidate_hash))
 
-            # Get detailed AI analysis
-            analysis = await self._analyze_match(job, candidate)
+            match = stored.get((job.id, candidate.id))
+            analysis = None
+            if (
+                not refresh
+                and match is not None
+                and match.job_hash == job_hash
+                and match.candidate_hash == candidate_hash
+            ):
+                try:
+                    analysis = json.loads(match.ai_analysis)
+                except (TypeError, json.JSONDecodeError):
+                    analysis = None
+            results.append(analysis)
 
-            # Create or update match record
-            match = (
-                db.query(Match)
-                .filter(
-                    Match.job_id == job.id,
-                    Match.candidate_id == candidate.id,
-                )
-                .first()
+        # Only pairs without a usable stored analysis go to the LLM
+        stale = [idx for idx, analysis in enumerate(results) if analysis is None]
+        fresh = await self._analyze_matches([pairs[idx] for idx in stale])
+        for idx, analysis in zip(stale, fresh):
+            results[idx] = analysis
+            if analysis.get("error"):
+                continue  # don't persist failures; retry on the next view
+            job, candidate = pairs[idx]
+            self._save_match(
+                db,
+                stored.get((job.id, candidate.id)),
+                job,
+                candidate,
+                analysis,
+                *hashes[idx],
             )
 
-            if not match:
-                match = Match(
-                    job_id=job.id,
-                    candidate_id=candidate.id,
-                    match_score=analysis["match_score"],
-                    ai_analysis=json.dumps(analysis),
-                )
-                db.add(match)
-            else:
-                match.match_score = analysis["match_score"]
-                match.ai_analysis = json.dumps(analysis)
+        return results
+
+    def _save_match(
+        self,
+        db: Session,
+        match: Optional[Match],
+        job: JobPosting,
+        candidate: Candidate,
+        analysis: Dict,
+        job_hash: str,
+        candidate_hash: str,
+    ):
+        """Create or update the stored match record for a pair"""
+        if not match:
+            match = Match(job_id=job.id, candidate_id=candidate.id)
+            db.add(match)
+
+        match.match_score = analysis["match_score"]
+        match.ai_analysis = json.dumps(analysis)
+        match.job_hash = job_hash
+        match.candidate_hash = candidate_hash
+
+    async def _get_vector(self, embedding_id: Optional[str], text: str) -> List[float]:
+        """Use the stored vector when available, embedding the text otherwise"""
+        if embedding_id:
+            stored = await self.vector_store.get_embeddings([embedding_id])
+            if embedding_id in stored:
+                return stored[embedding_id]
+        return await self.vector_store._get_embedding(text)
 
+    def _load_hits(self, db: Session, results: Dict, model, kind: str) -> List:
+        """Map query hits to rows with one bulk load, keeping rank order"""
+        ids = [
+            record_id
+            for record_id in (
+                record_id_from_metadata(metadata, kind)
+                for metadata in results["metadatas"][0]
+            )
+            if record_id is not None
+        ]
+        if not ids:
+            return []
+        rows = {row.id: row for row in db.query(model).filter(model.id.in_(ids))}
+        return [rows[record_id] for record_id in dict.fromkeys(ids) if record_id in rows]
+
+    async def find_matching_candidates(
+        self,
+        job: JobPosting,
+        db: Session,
+        limit: int = 5,
+        refresh: bool = False,
+        location: Optional[str] = None,
+        include_remote: bool = True,
+    ) -> List[Dict]:
+        """Find and analyze matching candidates for a job posting"""
+        # Reuse the job vector stored at creation time
+        job_embedding = await self._get_vector(
+            job.embedding_id, f"{job.title} {job.description} {job.requirements}"
+        )
+
+        # Search for candidates; pre-filters run inside the vector query so
+        # impossible matches never take a top-k slot or an LLM call
+        results = await self.vector_store.query(
+            [job_embedding],
+            limit,
+            where=build_where(
+                "candidate", location=location, include_remote=include_remote
+            ),
+            include=["metadatas", "distances"],
+        )
+        candidates = self._load_hits(db, results, Candidate, "candidate")
+
+        # Get detailed AI analysis, reusing stored results where possible
+        analyses = await self._get_analyses(
+            db, [(job, candidate) for candidate in candidates], refresh
+        )
+
+        matches = []
+        for candidate, analysis in zip(candidates, analyses):
             matches.append(
                 {
                     "candidate": candidate,
@@ -134,64 +426,51 @@ Provide your analysis in the following JSON format:
         return sorted(matches, key=lambda x: x["match_score"], reverse=True)
 
     async def find_matching_jobs(
-        self, candidate: Candidate, db: Session, limit: int = 5
+        self,
+        candidate: Candidate,
+        db: Session,
+        limit: int = 5,
+        refresh: bool = False,
+        status: Optional[str] = "active",
+        location: Optional[str] = None,
+        include_remote: bool = True,
+        min_salary: Optional[float] = None,
+        max_salary: Optional[float] = None,
     ) -> List[Dict]:
         """Find and analyze matching jobs for a candidate"""
-        # Get candidate embedding
-        candidate_embedding = await self.vector_store._get_embedding(
-            f"{candidate.skills} {candidate.experience} {candidate.resume_text}"
+        # Reuse the candidate vector stored at creation time
+        candidate_embedding = await self._get_vector(
+            candidate.embedding_id,
+            f"{candidate.skills} {candidate.experience} {candidate.resume_text}",
         )
 
-        # Search for jobs
-        results = self.vector_store.collection.query(
-            query_embeddings=[candidate_embedding],
-            n_results=limit,
-            where={"type": "job"},  # Filter for job embeddings
-            include=["documents", "metadatas", "distances"],
+        # Search for jobs; pre-filters run inside the vector query so
+        # impossible matches never take a top-k slot or an LLM call
+        results = await self.vector_store.query(
+            [candidate_embedding],
+            limit,
+            where=build_where(
+                "job",
+                status=status,
+                location=location,
+                include_remote=include_remote,
+                min_salary=min_salary,
+                max_salary=max_salary,
+            ),
+            include=["metadatas", "distances"],
         )
+        jobs = self._load_hits(db, results, JobPosting, "job")
+        if status:
+            # Vector metadata can lag behind status changes made in SQL
+            jobs = [job for job in jobs if job.status == status]
 
-        matches = []
-        for doc, metadata, distance in zip(
-            results["documents"][0],
-            results["metadatas"][0],
-            results["distances"][0],
-        ):
-            job = (
-                db.query(JobPosting)
-                .filter(JobPosting.embedding_id == metadata["embedding_id"])
-                .first()
-            )
-            if not job:
-                continue
-
-            # Calculate initial similarity score
-            similarity_score = 1 - distance
-
-            # Get detailed AI analysis
-            analysis = await self._analyze_match(job, candidate)
-
-            # Create or update match record
-            match = (
-                db.query(Match)
-                .filter(
-                    Match.job_id == job.id,
-                    Match.candidate_id == candidate.id,
-                )
-                .first()
-            )
-
-            if not match:
-                match = Match(
-                    job_id=job.id,
-                    candidate_id=candidate.id,
-                    match_score=analysis["match_score"],
-                    ai_analysis=json.dumps(analysis),
-                )
-                db.add(match)
-            else:
-                match.match_score = analysis["match_score"]
-                match.ai_analysis = json.dumps(analysis)
+        # Get detailed AI analysis, reusing stored results where possible
+        analyses = await self._get_analyses(
+            db, [(job, candidate) for job in jobs], refresh
+        )
 
+        matches = []
+        for job, analysis in zip(jobs, analyses):
             matches.append(
                 {
                     "job": job,
@@ -204,3 +483,36 @@ Provide your analysis in the following JSON format:
 
         db.commit()
         return sorted(matches, key=lambda x: x["match_score"], reverse=True)
+
+    def vector_metadata_outdated(self) -> bool:
+        """Whether any job/candidate vector predates the matching metadata"""
+        results = self.vector_store.collection.get(
+            where={"type": {"$in": ["job", "candidate"]}}, include=["metadatas"]
+        )
+        return any(
+            f"{metadata.get('type')}_id" not in metadata
+            for metadata in results["metadatas"]
+        )
+
+    def sync_vector_metadata(self, db: Session, batch_size: int = 500) -> int:
+        """Rewrite job and candidate vector metadata from the current rows"""
+        updated = 0
+        for model, build in ((JobPosting, job_metadata), (Candidate, candidate_metadata)):
+            last_id = 0
+            while True:
+                rows = (
+                    db.query(model)
+                    .filter(model.embedding_id.isnot(None), model.id > last_id)
+                    .order_by(model.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                self.vector_store.collection.update(
+                    ids=[row.embedding_id for row in rows],
+                    metadatas=[build(row) for row in rows],
+                )
+                updated += len(rows)
+        return updated
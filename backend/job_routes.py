@@ -1,8 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+import asyncio
 from database import get_db
-from models import JobPosting, Candidate, Match, Email
+from models import JobPosting, Candidate, EmailClassification
 from job_schemas import (
     JobPostingCreate,
     JobPostingResponse,
@@ -11,22 +12,13 @@ from job_schemas import (
     JobMatches,
     CandidateMatches,
 )
-from job_matcher import JobMatcher
-from vector_store import VectorStore
-from config import Settings
-from openai import AsyncOpenAI
-import re
-from datetime import datetime, timedelta
-import json
+from job_matcher import job_metadata, candidate_metadata
+from email_prefilter import PREFILTER_VERSION
+from services import services
+from task_queue import enqueue
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 
-# Initialize services
-settings = Settings()
-vector_store = VectorStore(settings)
-openai_client = AsyncOpenAI(api_key=settings.openai_api_key)
-job_matcher = JobMatcher(vector_store, openai_client)
-
 
 @router.post("/postings/", response_model=JobPostingResponse)
 async def create_job_posting(job: JobPostingCreate, db: Session = Depends(get_db)):
@@ -39,12 +31,8 @@ async def create_job_posting(job: JobPostingCreate, db: Session = Depends(get_db
 
         # Create embedding
         job_text = f"{job.title} {job.description} {job.requirements}"
-        embedding_id = await vector_store.add_text(
-            job_text,
-            metadata={
-                "type": "job",
-                "embedding_id": f"job_{job_posting.id}",
-            },
+        embedding_id = await services.vector_store.add_text(
+            job_text, metadata=job_metadata(job_posting)
         )
         job_posting.embedding_id = embedding_id
 
@@ -68,12 +56,8 @@ async def create_candidate(candidate: CandidateCreate, db: Session = Depends(get
         candidate_text = (
             f"{candidate.skills} {candidate.experience} {candidate.resume_text}"
         )
-        embedding_id = await vector_store.add_text(
-            candidate_text,
-            metadata={
-                "type": "candidate",
-                "embedding_id": f"candidate_{candidate_profile.id}",
-            },
+        embedding_id = await services.vector_store.add_text(
+            candidate_text, metadata=candidate_metadata(candidate_profile)
         )
         candidate_profile.embedding_id = embedding_id
 
@@ -103,13 +87,34 @@ async def list_candidates(
 
 
 @router.get("/postings/{job_id}/matches", response_model=JobMatches)
-async def get_job_matches(job_id: int, limit: int = 5, db: Session = Depends(get_db)):
-    """Get matching candidates for a job posting"""
+async def get_job_matches(
+    job_id: int,
+    limit: int = 5,
+    refresh: bool = False,
+    location: Optional[str] = None,
+    include_remote: bool = True,
+    same_location: bool = False,
+    db: Session = Depends(get_db),
+):
+    """Get matching candidates for a job posting; refresh=true re-runs the analysis.
+
+    same_location=true filters on the job's own location. Candidates carry no
+    status or salary, so those filters only exist on the candidate endpoint.
+    """
     job = db.query(JobPosting).filter(JobPosting.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job posting not found")
-
-    matches = await job_matcher.find_matching_candidates(job, db, limit)
+    if same_location and location is None:
+        location = job.location
+
+    matches = await services.job_matcher.find_matching_candidates(
+        job,
+        db,
+        limit,
+        refresh,
+        location=location,
+        include_remote=include_remote,
+    )
     return {
         "job": job,
         "matches": [
@@ -125,14 +130,32 @@ async def get_job_matches(job_id: int, limit: int = 5, db: Session = Depends(get
 
 @router.get("/candidates/{candidate_id}/matches", response_model=CandidateMatches)
 async def get_candidate_matches(
-    candidate_id: int, limit: int = 5, db: Session = Depends(get_db)
+    candidate_id: int,
+    limit: int = 5,
+    refresh: bool = False,
+    status: Optional[str] = "active",
+    location: Optional[str] = None,
+    include_remote: bool = True,
+    min_salary: Optional[float] = None,
+    max_salary: Optional[float] = None,
+    db: Session = Depends(get_db),
 ):
-    """Get matching jobs for a candidate"""
+    """Get matching jobs for a candidate; refresh=true re-runs the analysis"""
     candidate = db.query(Candidate).filter(Candidate.id == candidate_id).first()
     if not candidate:
         raise HTTPException(status_code=404, detail="Candidate not found")
 
-    matches = await job_matcher.find_matching_jobs(candidate, db, limit)
+    matches = await services.job_matcher.find_matching_jobs(
+        candidate,
+        db,
+        limit,
+        refresh,
+        status=status,
+        location=location,
+        include_remote=include_remote,
+        min_salary=min_salary,
+        max_salary=max_salary,
+    )
     return {
         "candidate": candidate,
         "matches": [
@@ -146,145 +169,55 @@ async def get_candidate_matches(
     }
 
 
-@router.post("/refresh/")
-async def refresh_jobs_and_candidates(db: Session = Depends(get_db)):
-    """Process emails to extract job postings and candidates"""
+@router.post("/sync-metadata/")
+async def sync_vector_metadata(db: Session = Depends(get_db)):
+    """Rewrite job/candidate vector metadata (status, location, salary) from SQL"""
     try:
-        # Get all emails instead of just recent ones
-        emails = db.query(Email).all()
-
-        jobs_created = 0
-        candidates_created = 0
-
-        for email in emails:
-            try:
-                # First, use OpenAI to classify the email and extract structured information
-                prompt = f"""Analyze this email and determine if it's a job posting or a candidate profile.
-                Then extract relevant information in JSON format.
-
-                Email Subject: {email.subject}
-                Email Content: {email.content}
-
-                Respond in this JSON format:
-                {{
-                    "type": "job_posting" or "candidate_profile" or "other",
-                    "confidence": 0.0 to 1.0,
-                    "extracted_info": {{
-                        // For job_posting:
-                        "title": "extracted job title",
-                        "company": "company name",
-                        "location": "job location",
-                        "requirements": "list of requirements",
-                        "salary_range": "salary range if mentioned",
-
-                        // For candidate_profile:
-                        "name": "candidate name",
-                        "skills": "extracted skills",
-                        "experience": "extracted experience",
-                        "preferred_location": "preferred location if mentioned"
-                    }}
-                }}"""
-
-                response = await openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are an expert at analyzing emails and extracting job-related information.",
-                        },
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.3,
-                    response_format={"type": "json_object"},
-                )
-
-                analysis = response.choices[0].message.content
-                result = json.loads(analysis)
-
-                if result["type"] == "job_posting" and result["confidence"] > 0.7:
-                    # Check if job already exists
-                    existing_job = (
-                        db.query(JobPosting)
-                        .filter(
-                            JobPosting.title == result["extracted_info"]["title"],
-                            JobPosting.company == result["extracted_info"]["company"],
-                            JobPosting.source_email_id == email.id,
-                        )
-                        .first()
-                    )
-
-                    if not existing_job:
-                        # Create job posting
-                        job = JobPosting(
-                            title=result["extracted_info"]["title"],
-                            company=result["extracted_info"]["company"],
-                            description=email.content,
-                            requirements=result["extracted_info"]["requirements"],
-                            location=result["extracted_info"]["location"],
-                            salary_range=result["extracted_info"].get("salary_range"),
-                            status="active",
-                            source_email_id=email.id,
-                        )
-                        db.add(job)
-                        db.flush()
-
-                        # Create embedding for job
-                        job_text = f"{job.title} {job.description} {job.requirements}"
-                        embedding_id = await vector_store.add_text(
-                            job_text,
-                            metadata={
-                                "type": "job",
-                                "embedding_id": f"job_{job.id}",
-                            },
-                        )
-                        job.embedding_id = embedding_id
-                        jobs_created += 1
-
-                elif (
-                    result["type"] == "candidate_profile" and result["confidence"] > 0.7
-                ):
-                    # Check if candidate already exists
-                    existing_candidate = (
-                        db.query(Candidate)
-                        .filter(Candidate.email == email.sender)
-                        .first()
-                    )
+        # Chroma updates are blocking network calls in server mode
+        updated = await asyncio.to_thread(
+            services.job_matcher.sync_vector_metadata, db
+        )
+        return {"message": f"Updated metadata for {updated} vectors"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-                    if not existing_candidate:
-                        # Create candidate profile
-                        candidate = Candidate(
-                            name=result["extracted_info"]["name"],
-                            email=email.sender,
-                            resume_text=email.content,
-                            skills=result["extracted_info"]["skills"],
-                            experience=result["extracted_info"]["experience"],
-                            preferred_location=result["extracted_info"].get(
-                                "preferred_location"
-                            ),
-                        )
-                        db.add(candidate)
-                        db.flush()
 
-                        # Create embedding for candidate
-                        candidate_text = f"{candidate.skills} {candidate.experience} {candidate.resume_text}"
-                        embedding_id = await vector_store.add_text(
-                            candidate_text,
-                            metadata={
-                                "type": "candidate",
-                                "embedding_id": f"candidate_{candidate.id}",
-                            },
-                        )
-                        candidate.embedding_id = embedding_id
-                        candidates_created += 1
+@router.post("/match-all/")
+async def match_all(db: Session = Depends(get_db)):
+    """Queue shortlisting candidates for every active job"""
+    task = enqueue(db, "match_all")
+    return {"task_id": task.id, "status": task.status}
 
-            except Exception as email_error:
-                print(f"Error processing email {email.id}: {str(email_error)}")
-                continue
 
-        db.commit()
-        return {
-            "message": f"Processed {len(emails)} emails. Created {jobs_created} jobs and {candidates_created} candidates."
-        }
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+@router.post("/refresh/")
+async def refresh_jobs_and_candidates(
+    recheck_prefiltered: bool = False, db: Session = Depends(get_db)
+):
+    """Queue classification of new emails into job postings and candidates"""
+    task = enqueue(db, "refresh_jobs", {"recheck_prefiltered": recheck_prefiltered})
+    return {"task_id": task.id, "status": task.status}
+
+
+@router.get("/refresh/prefilter-stats")
+async def get_prefilter_stats(db: Session = Depends(get_db)):
+    """Prefilter counters across all refresh runs"""
+    if not services.settings.prefilter_enabled:
+        return {"enabled": False}
+    # Only classifications made while the prefilter ran count as checked
+    checked = (
+        db.query(EmailClassification)
+        .filter(EmailClassification.prefilter_score.isnot(None))
+        .count()
+    )
+    skipped = (
+        db.query(EmailClassification)
+        .filter(EmailClassification.model_version == PREFILTER_VERSION)
+        .count()
+    )
+    return {
+        "enabled": True,
+        "threshold": services.settings.prefilter_threshold,
+        "checked": checked,
+        "llm_calls_skipped": skipped,
+        "skip_ratio": skipped / checked if checked else 0.0,
+    }
@@ -0,0 +1,210 @@
+from typing import Dict, List, Optional, Tuple
+from email_prefilter import CANDIDATE_SIGNALS
+import re
+
+RULES_VERSION = "job-rules-v2"
+
+# Weight each field contributes to the extraction confidence
+FIELD_WEIGHTS = {
+    "title": 0.35,
+    "requirements": 0.25,
+    "company": 0.15,
+    "location": 0.15,
+    "salary_range": 0.10,
+}
+
+FREE_MAIL_DOMAINS = {
+    "gmail",
+    "googlemail",
+    "yahoo",
+    "outlook",
+    "hotmail",
+    "icloud",
+    "aol",
+    "protonmail",
+    "googlegroups",
+}
+
+SALARY_PATTERN = re.compile(
+    r"\$\s?(\d[\d,]*(?:\.\d+)?)\s?([kK])?\s?(?:-|–|to)\s?\$?\s?(\d[\d,]*(?:\.\d+)?)\s?([kK])?"
+)
+
+LABEL_PATTERNS = {
+    "title": re.compile(r"^\s*(?:job\s+)?(?:title|position|role)\s*:\s*(.+)$", re.I | re.M),
+    "company": re.compile(r"^\s*(?:company|employer|organi[sz]ation)\s*:\s*(.+)$", re.I | re.M),
+    "location": re.compile(r"^\s*(?:location|based in|office)\s*:\s*(.+)$", re.I | re.M),
+}
+
+SUBJECT_TITLE_PATTERNS = [
+    # "Senior AI Engineer Position at TechStartup", "Product Manager Opening at X"
+    re.compile(
+        r"^(?:\[[^\]]*\]\s*)?(?P<title>.+?)\s+(?:position|role|opening|opportunity)"
+        r"(?:\s+at\s+(?P<company>.+))?$",
+        re.I,
+    ),
+    # "Hiring: Backend Engineer @ Acme", "Now hiring - Data Scientist"
+    re.compile(
+        r"^(?:\[[^\]]*\]\s*)?(?:now\s+)?hiring\s*[:\-–]?\s*(?:an?\s+)?(?P<title>.+?)"
+        r"(?:\s+(?:at|@)\s+(?P<company>.+))?$",
+        re.I,
+    ),
+]
+
+BODY_TITLE_PATTERN = re.compile(
+    r"\b(?:seeking|looking for|hiring)\s+(?:an?\s+)?(?P<title>[A-Z][\w/+#.-]*(?:\s+[A-Z][\w/+#.-]*){0,5})"
+    r"(?:\s+to\s+join\b(?:[^.\n]*?\bat\s+(?P<company>[A-Z][\w.&-]*(?:\s+[A-Z][\w.&-]*){0,3}))?)?"
+)
+
+REQUIREMENTS_HEADER = re.compile(
+    r"^\s*(?:requirements|required skills|qualifications|what you(?:'ll)? need"
+    r"|what we(?:'re)? looking for|must have)\s*:?\s*$",
+    re.I | re.M,
+)
+
+# Without one of these (or a salary / labeled location) a posting-shaped email
+# may be a discussion or a profile, so it goes to the LLM
+HIRING_CUE = re.compile(
+    r"\bwe(?:'re| are) hiring\b|\bnow hiring\b|\bhiring\s*[:\-–]|\bapply\b"
+    r"|\bsend (?:us )?your (?:resume|cv)\b|\bjoin our team\b",
+    re.I,
+)
+CANDIDATE_CUE = re.compile(
+    "|".join(f"(?:{pattern})" for pattern, _ in CANDIDATE_SIGNALS), re.I
+)
+
+BULLET = re.compile(r"^\s*(?:[-*•+]|\d+[.)])\s+(.+)$")
+
+REMOTE_PATTERN = re.compile(r"\b(?:fully\s+)?remote(?:[- ]first)?\b", re.I)
+CITY_PATTERN = re.compile(r"\b(?:in|based in)\s+([A-Z][a-zA-Z.]+(?:\s[A-Z][a-zA-Z.]+)*,\s*[A-Z]{2})\b")
+
+
+def _clean(value: str) -> str:
+    return " ".join(value.strip(" \t-–:|").split())
+
+
+def _salary_number(amount: str, thousands: Optional[str]) -> float:
+    value = float(amount.replace(",", ""))
+    return value * 1000 if thousands else value
+
+
+def parse_salary_range(text: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+    """Numeric (min, max) yearly bounds from text like "$150k-$200k" """
+    if not text:
+        return None, None
+    match = SALARY_PATTERN.search(text)
+    if not match:
+        return None, None
+    low_amount, low_k, high_amount, high_k = match.groups()
+    # "$150-200k" puts the k only on the upper bound
+    low = _salary_number(low_amount, low_k or high_k)
+    high = _salary_number(high_amount, high_k)
+    return min(low, high), max(low, high)
+
+
+def extract_salary_range(content: str) -> Optional[str]:
+    match = SALARY_PATTERN.search(content)
+    return _clean(match.group(0)) if match else None
+
+
+def extract_requirements(content: str) -> List[str]:
+    """Bullet lines of the first requirements-style section"""
+    header = REQUIREMENTS_HEADER.search(content)
+    if not header:
+        return []
+    requirements = []
+    for line in content[header.end() :].splitlines():
+        if not line.strip():
+            if requirements:
+                break
+            continue
+        bullet = BULLET.match(line)
+        if not bullet:
+            break
+        requirements.append(_clean(bullet.group(1)))
+    return requirements
+
+
+def extract_location(content: str) -> Optional[str]:
+    labeled = LABEL_PATTERNS["location"].search(content)
+    if labeled:
+        return _clean(labeled.group(1))
+    city = CITY_PATTERN.search(content)
+    if city:
+        return city.group(1)
+    if REMOTE_PATTERN.search(content):
+        return "Remote"
+    return None
+
+
+def company_from_sender(sender: Optional[str]) -> Optional[str]:
+    """Company name guessed from a non-webmail sender domain"""
+    if not sender or "@" not in sender:
+        return None
+    domain = sender.rsplit("@", 1)[1].strip("> ").lower()
+    name = domain.split(".")[0]
+    if not name or name in FREE_MAIL_DOMAINS:
+        return None
+    return name.title()
+
+
+def extract_job_fields(
+    subject: str, content: str, sender: Optional[str] = None
+) -> Tuple[Dict, float]:
+    """Rule-based job posting fields plus a 0-1 confidence score"""
+    subject = _clean(re.sub(r"^(?:re|fwd?)\s*:\s*", "", subject or "", flags=re.I))
+    content = content or ""
+    fields: Dict = {}
+
+    labeled_title = LABEL_PATTERNS["title"].search(content)
+    if labeled_title:
+        fields["title"] = _clean(labeled_title.group(1))
+    for pattern in SUBJECT_TITLE_PATTERNS:
+        match = pattern.match(subject)
+        if match:
+            fields.setdefault("title", _clean(match.group("title")))
+            if match.group("company"):
+                fields["company"] = _clean(match.group("company"))
+            break
+    if "title" not in fields:
+        match = BODY_TITLE_PATTERN.search(content)
+        if match:
+            fields["title"] = _clean(match.group("title"))
+            if match.group("company"):
+                fields.setdefault("company", _clean(match.group("company")))
+
+    labeled_company = LABEL_PATTERNS["company"].search(content)
+    if labeled_company:
+        fields["company"] = _clean(labeled_company.group(1))
+    elif "company" not in fields and company_from_sender(sender):
+        fields["company"] = company_from_sender(sender)
+
+    location = extract_location(content)
+    if location:
+        fields["location"] = location
+
+    requirements = extract_requirements(content)
+    if requirements:
+        fields["requirements"] = "\n".join(requirements)
+
+    salary_range = extract_salary_range(content)
+    if salary_range:
+        fields["salary_range"] = salary_range
+
+    confidence = sum(
+        weight for field, weight in FIELD_WEIGHTS.items() if fields.get(field)
+    )
+    # Without a title and requirements there is nothing to build a posting from
+    if not fields.get("title") or not fields.get("requirements"):
+        confidence = min(confidence, 0.5)
+
+    # Only confirmed hiring emails skip the LLM
+    text = f"{subject}\n{content}"
+    hiring = (
+        HIRING_CUE.search(text)
+        or fields.get("salary_range")
+        or LABEL_PATTERNS["location"].search(content)
+    )
+    if not hiring or CANDIDATE_CUE.search(text):
+        confidence = min(confidence, 0.5)
+
+    return fields, round(confidence, 2)
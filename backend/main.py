@@ -1,18 +1,22 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
-import uvicorn
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
+import time
 from datetime import datetime
-from sqlalchemy import or_
+from sqlalchemy import func
 
-from database import get_db, init_db
+from database import get_db, init_db, engine
 from models import Base, Email
 from schemas import EmailCreate, EmailResponse, SimilarityResponse
-from email_processor import EmailProcessor
-from vector_store import VectorStore
-from config import Settings
+from services import services
 from job_routes import router as job_router
+from thread_routes import router as thread_router
+from task_routes import router as task_router
+from task_queue import enqueue
+from semantic_cache import content_key
+import query_stats
+import metrics
 
 app = FastAPI(title="Advanced Email RAG System")
 
@@ -26,31 +30,90 @@ app.add_middleware(
 )
 
 # Initialize services
-settings = Settings()
-email_processor = EmailProcessor(settings)
-vector_store = VectorStore(settings)
+settings = services.settings
+query_stats.install(engine, settings.slow_query_threshold_ms)
+
+
+@app.middleware("http")
+async def record_query_stats(request: Request, call_next):
+    """Expose per-request SQL count and timing as response headers"""
+    stats, token = query_stats.begin_request(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+    finally:
+        query_stats.end_request(token)
+    response.headers.update(stats.as_headers())
+    query_stats.check_query_count(stats, settings.query_count_warning)
+    return response
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Per-route latency histogram; routes are labelled by their path template"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.REQUEST_LATENCY.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of this process's metrics"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    await services.startup()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await services.shutdown()
 
 
 @app.get("/emails/", response_model=List[EmailResponse])
-async def get_emails(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all processed emails with pagination"""
-    emails = db.query(Email).offset(skip).limit(limit).all()
-    return emails
+async def get_emails(
+    skip: int = 0,
+    limit: int = 100,
+    category: Optional[str] = None,
+    min_importance: Optional[float] = None,
+    db: Session = Depends(get_db),
+):
+    """Get processed emails with pagination, optionally filtered by score"""
+    query = db.query(Email).options(selectinload(Email.body))
+    if category:
+        query = query.filter(Email.category == category)
+    if min_importance is not None:
+        query = query.filter(Email.importance_score >= min_importance).order_by(
+            Email.importance_score.desc()
+        )
+    return query.offset(skip).limit(limit).all()
+
+
+@app.post("/emails/score")
+async def score_emails(full: bool = False, db: Session = Depends(get_db)):
+    """Queue category/importance scoring; full=true rescores every email"""
+    task = enqueue(db, "score_emails", {"full": full})
+    return {"task_id": task.id, "status": task.status}
 
 
 @app.post("/process-emails/")
 async def process_emails(db: Session = Depends(get_db)):
-    """Process all emails from the IMAP server"""
-    try:
-        processed_emails = await email_processor.process_all_emails(db)
-        return {"message": f"Processed {len(processed_emails)} emails"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """Queue processing of all emails from the IMAP server"""
+    task = enqueue(db, "process_emails")
+    return {"task_id": task.id, "status": task.status}
 
 
 @app.get("/similar-emails/{email_id}", response_model=SimilarityResponse)
@@ -67,7 +130,7 @@ async def find_similar_emails(email_id: int, db: Session = Depends(get_db)):
         "thread_id": email.thread_id,
     }
 
-    similar_emails = await vector_store.find_similar_emails(
+    similar_emails = await services.vector_store.find_similar_emails(
         email.content,
         db,
         n_results=3,  # Limit to top 3 for LLM analysis
@@ -79,27 +142,80 @@ async def find_similar_emails(email_id: int, db: Session = Depends(get_db)):
 
 @app.post("/auto-reply/{email_id}")
 async def generate_auto_reply(email_id: int, db: Session = Depends(get_db)):
-    """Generate an auto-reply based on similar past emails"""
-    email = db.query(Email).filter(Email.id == email_id).first()
+    """Suggest the reply that was sent to the most similar past question"""
+    email = (
+        db.query(Email)
+        .options(selectinload(Email.body))
+        .filter(Email.id == email_id)
+        .first()
+    )
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
 
-    similar_emails_response = await vector_store.find_similar_emails(email.content, db)
-
-    if (
-        similar_emails_response["similarity_score"] >= 0.7
-    ):  # Lower threshold for better matches
-        return {
-            "can_auto_reply": True,
-            "reply": similar_emails_response["best_match"]["content"],
-            "similarity_score": similar_emails_response["similarity_score"],
-        }
-    else:
-        return {
-            "can_auto_reply": False,
-            "similar_questions": similar_emails_response["similar_emails"],
-            "message": "No similar question found with high confidence",
-        }
+    cache = services.auto_reply_cache if settings.auto_reply_cache_enabled else None
+    key = content_key(f"{email.subject}\n{email.content}")
+    vector = await services.reply_index.email_vector(email)
+
+    if cache is not None:
+        # An answer taken from this email's own thread would just echo it
+        cached = cache.get(
+            key,
+            vector,
+            accept=lambda value: value["thread_id"] != email.thread_id,
+            version=services.reply_index.version(db),
+        )
+        if cached is not None:
+            response = cached["response"]
+            if not response["can_auto_reply"]:
+                # Similar questions belong to the email that was looked up
+                response = {**response, "similar_questions": []}
+            return {**response, "cached": True}
+
+    candidates = await services.reply_index.find_replies(email, vector=vector)
+
+    response = {
+        "can_auto_reply": False,
+        "similar_questions": candidates,
+        "message": "No similar question found with high confidence",
+    }
+    answer_thread_id = None
+    if candidates and candidates[0]["similarity_score"] >= 0.7:
+        best = candidates[0]
+        reply = (
+            db.query(Email)
+            .options(selectinload(Email.body))
+            .filter(Email.id == best["reply_email_id"])
+            .first()
+        )
+        if reply:
+            response = {
+                "can_auto_reply": True,
+                "reply": reply.content,
+                "reply_email_id": reply.id,
+                "question_email_id": best["question_email_id"],
+                "similarity_score": best["similarity_score"],
+            }
+            answer_thread_id = reply.thread_id
+
+    if cache is not None:
+        decision = {k: v for k, v in response.items() if k != "similar_questions"}
+        cache.put(key, vector, {"response": decision, "thread_id": answer_thread_id})
+    return {**response, "cached": False}
+
+
+@app.get("/auto-reply/cache-stats")
+async def get_auto_reply_cache_stats():
+    """Hit rate, size, threshold and TTL of the auto-reply semantic cache"""
+    if not settings.auto_reply_cache_enabled:
+        return {"enabled": False}
+    return {"enabled": True, **services.auto_reply_cache.stats()}
+
+
+@app.post("/reply-index/rebuild")
+async def rebuild_reply_index(db: Session = Depends(get_db)):
+    """Queue a full rebuild of the question/reply pair index"""
+    task = enqueue(db, "rebuild_reply_index")
+    return {"task_id": task.id, "status": task.status}
 
 
 @app.get("/emails/{email_id}", response_model=EmailResponse)
@@ -113,66 +229,74 @@ async def get_email(email_id: int, db: Session = Depends(get_db)):
 
 @app.post("/reprocess-embeddings/")
 async def reprocess_embeddings(db: Session = Depends(get_db)):
-    """Reprocess all emails to update their embeddings with the new model"""
-    try:
-        # Get all emails
-        emails = db.query(Email).all()
-
-        # Clear existing collection
-        vector_store.clear_collection()
-
-        # Reprocess each email
-        for email in emails:
-            # Create new embedding
-            embedding_id = await vector_store.add_text(
-                email.content,
-                metadata={
-                    "subject": email.subject,
-                    "thread_id": email.thread_id,
-                },
-            )
+    """Queue re-embedding of all emails with the current model"""
+    task = enqueue(db, "reprocess_embeddings")
+    return {"task_id": task.id, "status": task.status}
 
-            # Update email record
-            email.embedding_id = embedding_id
 
-        db.commit()
-        return {"message": f"Reprocessed {len(emails)} emails with new embeddings"}
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/openai-stats/")
+async def get_openai_stats():
+    """Per-model call counts, retries, token usage and latency for this process"""
+    return services.openai_client.stats()
 
 
 @app.get("/search/")
-async def search_emails(query: str, db: Session = Depends(get_db)):
+async def search_emails(
+    query: str, skip: int = 0, limit: int = 20, db: Session = Depends(get_db)
+):
     """Search emails by content and subject"""
     try:
-        # Search in vector store first
-        search_results = await vector_store.search_emails(query, db)
-
-        if not search_results:
-            # Fallback to basic SQL search if no vector results
-            search_pattern = f"%{query}%"
-            emails = (
-                db.query(Email)
-                .filter(
-                    or_(
-                        Email.subject.ilike(search_pattern),
-                        Email.content.ilike(search_pattern),
-                        Email.sender.ilike(search_pattern),
-                    )
-                )
+        # Search in vector store first. It returns its top-k for any query,
+        # so weak matches are dropped rather than shown
+        search_results = await services.vector_store.search_emails(
+            query, db, n_results=skip + limit
+        )
+        results = [
+            result
+            for result in search_results["results"]
+            if result["similarity_score"] >= settings.search_min_similarity
+        ]
+
+        if not results:
+            # Fallback to ranked full-text search over the GIN-indexed tsvector
+            ts_query = func.websearch_to_tsquery("english", query)
+            rank = func.ts_rank(Email.search_vector, ts_query).label("rank")
+            rows = (
+                db.query(Email, rank)
+                .options(selectinload(Email.body))
+                .filter(Email.search_vector.op("@@")(ts_query))
+                .order_by(rank.desc(), Email.received_date.desc())
+                .offset(skip)
+                .limit(limit)
                 .all()
             )
-            return {"results": emails}
-
-        return search_results
+            return {
+                "results": [
+                    {
+                        "id": email.id,
+                        "thread_id": email.thread_id,
+                        "subject": email.subject,
+                        "content": email.content,
+                        "sender": email.sender,
+                        "received_date": email.received_date,
+                        "rank": email_rank,
+                    }
+                    for email, email_rank in rows
+                ]
+            }
+
+        return {"results": results[skip : skip + limit]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# Add job routes
+# Add job and thread routes
 app.include_router(job_router)
+app.include_router(thread_router)
+app.include_router(task_router)
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
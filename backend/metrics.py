@@ -0,0 +1,245 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+import bisect
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers a sub-millisecond SQL statement up to a slow LLM call
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Observations come from the event loop and from to_thread workers
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> (per-bucket counts, sum)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            counts[index] += 1
+            self._series[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time of the block, including when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """(observation count, sum) for every label combination"""
+        with self._lock:
+            return {
+                key: (sum(counts), total)
+                for key, (counts, total) in self._series.items()
+            }
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = sorted(
+                (key, list(counts), total)
+                for key, (counts, total) in self._series.items()
+            )
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, key, f'le="{_format_value(bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+# Metrics are per process: scrape every API worker and the task worker
+REQUEST_LATENCY = registry.register(
+    Histogram(
+        "ebot_http_request_duration_seconds",
+        "HTTP request latency by route template",
+        ["method", "route", "status"],
+    )
+)
+EMBEDDING_LATENCY = registry.register(
+    Histogram(
+        "ebot_embedding_duration_seconds",
+        "OpenAI embeddings request latency, retries excluded",
+        ["model"],
+    )
+)
+LLM_LATENCY = registry.register(
+    Histogram(
+        "ebot_llm_chat_duration_seconds",
+        "OpenAI chat completion request latency, retries excluded",
+        ["model"],
+    )
+)
+OPENAI_ERRORS = registry.register(
+    Counter(
+        "ebot_openai_errors_total",
+        "Failed OpenAI attempts, including ones that were retried",
+        ["model", "error"],
+    )
+)
+OPENAI_TOKENS = registry.register(
+    Counter(
+        "ebot_openai_tokens_total",
+        "Tokens reported by the OpenAI API",
+        ["model", "kind"],
+    )
+)
+VECTOR_LATENCY = registry.register(
+    Histogram(
+        "ebot_vector_store_duration_seconds",
+        "Chroma call latency",
+        ["operation"],
+    )
+)
+DB_LATENCY = registry.register(
+    Histogram(
+        "ebot_db_query_duration_seconds",
+        "SQL statement execution time",
+    )
+)
+CACHE_LOOKUPS = registry.register(
+    Counter(
+        "ebot_cache_lookups_total",
+        "Semantic cache lookups by outcome",
+        ["cache", "result"],
+    )
+)
+EMAILS_INGESTED = registry.register(
+    Counter(
+        "ebot_emails_ingested_total",
+        "Emails stored by ingestion",
+        ["source", "outcome"],
+    )
+)
+
+
+def serve(port: int, host: str = "0.0.0.0") -> threading.Thread:
+    """Serve /metrics from a daemon thread, for processes without an API"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
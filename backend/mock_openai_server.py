@@ -0,0 +1,252 @@
+"""OpenAI-compatible stand-in server for load and integration tests.
+
+Serves /v1/embeddings and /v1/chat/completions with the deterministic
+responses from fake_openai, behind configurable latency, server errors and
+429s (random, or from a per-model RPM limit). Point the backend at it with
+OPENAI_BASE_URL=http://localhost:8100/v1.
+
+The fault settings can be changed while it runs with PUT /mock/config, and
+GET /mock/stats counts what was served.
+
+Usage: python mock_openai_server.py [--port 8100] [--latency lognormal]
+           [--embedding-latency-ms 80] [--chat-latency-ms 900]
+           [--error-rate 0.01] [--rate-limit-rate 0.02] [--rpm-limit N]
+"""
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Union
+import argparse
+import asyncio
+import base64
+import math
+import random
+import struct
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from fake_openai import chat_response, embeddings_response
+
+LATENCY_DISTRIBUTIONS = ("none", "fixed", "uniform", "lognormal")
+
+
+class MockConfig(BaseModel):
+    latency: str = "lognormal"
+    # Medians in milliseconds; lognormal_sigma sets how heavy the tail is
+    embedding_latency_ms: float = 80.0
+    chat_latency_ms: float = 900.0
+    lognormal_sigma: float = 0.5
+    error_rate: float = 0.0  # fraction of requests answered with a 500/503
+    rate_limit_rate: float = 0.0  # fraction answered with a 429
+    rpm_limit: Optional[int] = None  # per model; excess requests get a 429
+    retry_after_seconds: float = 1.0
+    seed: Optional[int] = None
+
+
+class EmbeddingRequest(BaseModel):
+    model: str
+    input: Union[str, List[str], List[int], List[List[int]]]
+    encoding_format: str = "float"
+    dimensions: Optional[int] = None
+
+
+class ChatRequest(BaseModel):
+    model: str
+    messages: List[Dict]
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    response_format: Optional[Dict] = None
+
+
+def _error(status: int, message: str, error_type: str, code: str, headers=None):
+    """Error body in the shape the openai SDK parses"""
+    return JSONResponse(
+        status_code=status,
+        content={
+            "error": {
+                "message": message,
+                "type": error_type,
+                "param": None,
+                "code": code,
+            }
+        },
+        headers=headers,
+    )
+
+
+class MockOpenAI:
+    def __init__(self, config: MockConfig):
+        self.configure(config)
+        # endpoint -> outcome -> count
+        self.requests: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+        self._recent: Dict[str, Deque[float]] = defaultdict(deque)
+
+    def configure(self, config: MockConfig):
+        if config.latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency must be one of {LATENCY_DISTRIBUTIONS}")
+        self.config = config
+        self.random = random.Random(config.seed)
+
+    def _delay(self, median_ms: float) -> float:
+        kind = self.config.latency
+        if kind == "none":
+            return 0.0
+        if kind == "fixed":
+            return median_ms / 1000
+        if kind == "uniform":
+            return self.random.uniform(0, 2 * median_ms) / 1000
+        sigma = self.config.lognormal_sigma
+        return self.random.lognormvariate(math.log(median_ms), sigma) / 1000
+
+    def _over_rpm_limit(self, model: str) -> bool:
+        if not self.config.rpm_limit:
+            return False
+        now = time.monotonic()
+        recent = self._recent[model]
+        while recent and recent[0] <= now - 60:
+            recent.popleft()
+        if len(recent) >= self.config.rpm_limit:
+            return True
+        recent.append(now)
+        return False
+
+    async def fault(self, endpoint: str, model: str, median_ms: float):
+        """A JSONResponse to return instead of a result, or None after the delay"""
+        counts = self.requests[endpoint]
+        counts["total"] += 1
+        roll = self.random.random()
+        retry_after = {"retry-after": f"{self.config.retry_after_seconds:g}"}
+
+        if self._over_rpm_limit(model) or roll < self.config.rate_limit_rate:
+            counts["rate_limited"] += 1
+            return _error(
+                429,
+                f"Rate limit reached for {model}",
+                "requests",
+                "rate_limit_exceeded",
+                retry_after,
+            )
+
+        await asyncio.sleep(self._delay(median_ms))
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            counts["errors"] += 1
+            status = self.random.choice((500, 503))
+            return _error(status, "The server had an error", "server_error", None)
+        counts["ok"] += 1
+        return None
+
+
+def _encode_base64(vector: List[float]) -> str:
+    return base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI API")
+    mock = MockOpenAI(config or MockConfig())
+    app.state.mock = mock
+
+    @app.post("/v1/embeddings")
+    async def create_embeddings(body: EmbeddingRequest):
+        response = await mock.fault(
+            "embeddings", body.model, mock.config.embedding_latency_ms
+        )
+        if response is not None:
+            return response
+
+        if isinstance(body.input, str):
+            texts = [body.input]
+        elif body.input and isinstance(body.input[0], int):
+            # One pre-tokenized input; token ids are hashed like words
+            texts = [" ".join(map(str, body.input))]
+        else:
+            texts = [
+                item if isinstance(item, str) else " ".join(map(str, item))
+                for item in body.input
+            ]
+
+        result = embeddings_response(texts, body.model, body.dimensions)
+        if body.encoding_format == "base64":
+            for item in result["data"]:
+                item["embedding"] = _encode_base64(item["embedding"])
+        return result
+
+    @app.post("/v1/chat/completions")
+    async def create_chat_completion(body: ChatRequest):
+        if body.response_format and body.response_format.get("type") not in (
+            "text",
+            "json_object",
+        ):
+            return _error(
+                400,
+                "Only text and json_object response formats are supported",
+                "invalid_request_error",
+                None,
+            )
+        response = await mock.fault(
+            "chat.completions", body.model, mock.config.chat_latency_ms
+        )
+        if response is not None:
+            return response
+        return chat_response(body.messages, body.model)
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {
+            "object": "list",
+            "data": [
+                {"id": model, "object": "model", "created": 0, "owned_by": "mock"}
+                for model in ("gpt-4o-mini", "text-embedding-3-small")
+            ],
+        }
+
+    @app.get("/mock/config")
+    async def get_config():
+        return mock.config
+
+    @app.put("/mock/config")
+    async def update_config(config: MockConfig):
+        try:
+            mock.configure(config)
+        except ValueError as e:
+            return _error(400, str(e), "invalid_request_error", None)
+        return mock.config
+
+    @app.get("/mock/stats")
+    async def get_stats():
+        return mock.requests
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible mock")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--embedding-latency-ms", type=float, default=80.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=900.0)
+    parser.add_argument("--lognormal-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--rpm-limit", type=int, default=None)
+    parser.add_argument("--retry-after-seconds", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        embedding_latency_ms=args.embedding_latency_ms,
+        chat_latency_ms=args.chat_latency_ms,
+        lognormal_sigma=args.lognormal_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        rpm_limit=args.rpm_limit,
+        retry_after_seconds=args.retry_after_seconds,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
@@ -8,37 +8,177 @@ from sqlalchemy import (
     ForeignKey,
     Table,
     Boolean,
+    LargeBinary,
+    Index,
+    UniqueConstraint,
+    DDL,
+    event,
 )
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import relationship, backref, deferred
 from datetime import datetime
+from typing import Optional
 from database import Base
+import zlib
 
 
 class Email(Base):
     __tablename__ = "emails"
+    __table_args__ = (
+        Index("ix_emails_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_emails_thread_sender", "thread_id", "sender"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     message_id = Column(String, unique=True, index=True)
     subject = Column(String)
     sender = Column(String)
     recipient = Column(String)
-    content = Column(Text)
-    html_content = Column(Text, nullable=True)
+    # Hot copies of the bodies; NULL once moved to email_bodies (see body)
+    _content = Column("content", Text)
+    _html_content = Column("html_content", Text, nullable=True)
+    is_archived = Column(Boolean, default=False, index=True)
     received_date = Column(DateTime, default=datetime.utcnow)
     thread_id = Column(String, ForeignKey("email_threads.thread_id"), index=True)
+    # NULL for near-duplicates, which share the canonical email's vector
     embedding_id = Column(String, unique=True)
+    duplicate_of_id = Column(
+        Integer, ForeignKey("emails.id", ondelete="SET NULL"), nullable=True, index=True
+    )
 
-    # Metadata
-    importance_score = Column(Float, default=0.0)
+    # Metadata; category and importance_score are filled in by email_scoring
+    importance_score = Column(Float, default=0.0, index=True)
     is_processed = Column(Boolean, default=False)
-    category = Column(String, nullable=True)
+    category = Column(String, nullable=True, index=True)
+    scored_at = Column(DateTime, nullable=True, index=True)
+
+    # Full-text search, maintained by a trigger so it survives archiving;
+    # deferred so normal loads skip it
+    search_vector = deferred(Column(TSVECTOR))
 
     # Relations
     parent_id = Column(Integer, ForeignKey("emails.id"), nullable=True)
+    # Message-ID of the parent, kept so replies seen first get linked later
+    in_reply_to = Column(String, nullable=True, index=True)
     replies = relationship(
         "Email",
         backref=backref("parent", remote_side=[id]),
         cascade="all, delete-orphan",
+        foreign_keys=[parent_id],
+    )
+    duplicate_of = relationship(
+        "Email", remote_side=[id], foreign_keys=[duplicate_of_id]
+    )
+    body = relationship(
+        "EmailBody", uselist=False, cascade="all, delete-orphan"
+    )
+
+    @hybrid_property
+    def content(self) -> Optional[str]:
+        if self._content is None and self.body is not None:
+            return self.body.get_text("content")
+        return self._content
+
+    @content.setter
+    def content(self, value: Optional[str]):
+        self._content = value
+
+    @content.expression
+    def content(cls):
+        return cls._content
+
+    @hybrid_property
+    def html_content(self) -> Optional[str]:
+        if self._html_content is None and self.body is not None:
+            return self.body.get_text("html_content")
+        return self._html_content
+
+    @html_content.setter
+    def html_content(self, value: Optional[str]):
+        # HTML is rarely read, so it always goes straight to cold storage
+        self._html_content = None
+        if value is None and self.body is None:
+            return
+        if self.body is None:
+            self.body = EmailBody()
+        self.body.set_text("html_content", value)
+
+    @html_content.expression
+    def html_content(cls):
+        return cls._html_content
+
+    def archive_body(self, include_content: bool = True):
+        """Move hot bodies into compressed cold storage"""
+        if self.body is None:
+            self.body = EmailBody()
+        if self._html_content is not None:
+            self.body.set_text("html_content", self._html_content)
+            self._html_content = None
+        if include_content:
+            if self._content is not None:
+                self.body.set_text("content", self._content)
+                self._content = None
+            self.is_archived = True
+
+
+class EmailBody(Base):
+    """zlib-compressed email bodies kept out of the hot emails table"""
+
+    __tablename__ = "email_bodies"
+
+    email_id = Column(
+        Integer, ForeignKey("emails.id", ondelete="CASCADE"), primary_key=True
+    )
+    content = Column(LargeBinary, nullable=True)
+    html_content = Column(LargeBinary, nullable=True)
+    stored_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def get_text(self, field: str) -> Optional[str]:
+        data = getattr(self, field)
+        return zlib.decompress(data).decode("utf-8") if data is not None else None
+
+    def set_text(self, field: str, value: Optional[str]):
+        setattr(
+            self,
+            field,
+            zlib.compress(value.encode("utf-8")) if value is not None else None,
+        )
+
+
+class EmailFingerprint(Base):
+    """MinHash signature of an email body (see near_duplicates.py)"""
+
+    __tablename__ = "email_fingerprints"
+
+    email_id = Column(
+        Integer, ForeignKey("emails.id", ondelete="CASCADE"), primary_key=True
+    )
+    signature = Column(LargeBinary, nullable=False)  # uint32 per permutation
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class EmailLshBucket(Base):
+    """LSH band buckets of canonical emails, looked up to find near-duplicates"""
+
+    __tablename__ = "email_lsh_buckets"
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(String(24), nullable=False, index=True)  # "<band>:<hash>"
+    email_id = Column(
+        Integer, ForeignKey("emails.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+
+
+class MessageIndex(Base):
+    """Every Message-ID seen, including ones only referenced, and its thread"""
+
+    __tablename__ = "message_index"
+
+    message_id = Column(String, primary_key=True)
+    thread_id = Column(String, nullable=False, index=True)
+    email_id = Column(
+        Integer, ForeignKey("emails.id", ondelete="SET NULL"), nullable=True, index=True
     )
 
 
@@ -49,11 +189,119 @@ class EmailThread(Base):
     thread_id = Column(String, unique=True, index=True)
     subject = Column(String)
     last_updated = Column(DateTime, default=datetime.utcnow)
-    participant_count = Column(Integer, default=1)
-    email_count = Column(Integer, default=1)
+    # Maintained by the emails_thread_stats trigger as emails are inserted
+    participant_count = Column(Integer, default=0)
+    email_count = Column(Integer, default=0)
 
     # Relations
-    emails = relationship("Email", backref="thread", lazy="dynamic")
+    emails = relationship(
+        "Email", backref="thread", order_by="Email.received_date"
+    )
+
+
+# Thread stats are derived from the emails table by a trigger rather than
+# being incremented by each ingest path.
+EMAIL_THREAD_STATS_FUNCTION = """
+CREATE OR REPLACE FUNCTION refresh_email_thread_stats(target_thread_id varchar)
+RETURNS void AS $$
+BEGIN
+    UPDATE email_threads t SET
+        email_count = s.email_count,
+        participant_count = s.participant_count,
+        last_updated = COALESCE(s.last_updated, t.last_updated)
+    FROM (
+        SELECT count(*) AS email_count,
+               count(DISTINCT sender) AS participant_count,
+               max(received_date) AS last_updated
+        FROM emails
+        WHERE thread_id = target_thread_id
+    ) s
+    WHERE t.thread_id = target_thread_id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION emails_thread_stats_trigger()
+RETURNS trigger AS $$
+BEGIN
+    -- Bulk thread merges switch this off and refresh the stats once
+    IF current_setting('ebot.skip_thread_stats', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    -- Inserts adjust the counters in place; rescanning the thread on every
+    -- insert would make ingesting a long thread quadratic
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.thread_id IS NOT NULL THEN
+            UPDATE email_threads SET
+                email_count = email_count + 1,
+                participant_count = participant_count + CASE
+                    WHEN NEW.sender IS NOT NULL AND NOT EXISTS (
+                        SELECT 1 FROM emails
+                        WHERE thread_id = NEW.thread_id
+                          AND sender = NEW.sender
+                          AND id <> NEW.id
+                    ) THEN 1 ELSE 0 END,
+                last_updated = GREATEST(last_updated, NEW.received_date)
+            WHERE thread_id = NEW.thread_id;
+        END IF;
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'UPDATE' AND NEW.thread_id IS NOT NULL THEN
+        PERFORM refresh_email_thread_stats(NEW.thread_id);
+    END IF;
+    IF TG_OP = 'DELETE' OR OLD.thread_id IS DISTINCT FROM NEW.thread_id THEN
+        IF OLD.thread_id IS NOT NULL THEN
+            PERFORM refresh_email_thread_stats(OLD.thread_id);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+EMAIL_THREAD_STATS_TRIGGER = """
+CREATE TRIGGER emails_thread_stats
+AFTER INSERT OR DELETE OR UPDATE OF thread_id, sender, received_date ON emails
+FOR EACH ROW EXECUTE FUNCTION emails_thread_stats_trigger();
+"""
+
+# Weighted full-text document: subject ranks above sender, sender above body.
+# An archived row has NULL content, so its existing vector is kept as-is.
+EMAIL_SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION emails_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR (
+        NEW.content IS NOT NULL
+        AND (NEW.subject, NEW.sender, NEW.content)
+            IS DISTINCT FROM (OLD.subject, OLD.sender, OLD.content)
+    ) THEN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.subject, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.sender, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.content, '')), 'C');
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+EMAIL_SEARCH_VECTOR_TRIGGER = """
+CREATE TRIGGER emails_search_vector
+BEFORE INSERT OR UPDATE ON emails
+FOR EACH ROW EXECUTE FUNCTION emails_search_vector_trigger();
+"""
+
+for statement in (
+    EMAIL_THREAD_STATS_FUNCTION,
+    EMAIL_THREAD_STATS_TRIGGER,
+    EMAIL_SEARCH_VECTOR_FUNCTION,
+    EMAIL_SEARCH_VECTOR_TRIGGER,
+):
+    event.listen(
+        Email.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="postgresql"),
+    )
 
 
 class JobPosting(Base):
@@ -92,15 +340,72 @@ class Candidate(Base):
 
 class Match(Base):
     __tablename__ = "matches"
+    __table_args__ = (
+        UniqueConstraint("job_id", "candidate_id", name="uq_matches_job_candidate"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     job_id = Column(Integer, ForeignKey("job_postings.id"))
     candidate_id = Column(Integer, ForeignKey("candidates.id"))
-    match_score = Column(Float)
+    match_score = Column(Float)  # from the LLM analysis
+    similarity_score = Column(Float, nullable=True)  # vector cosine similarity
     ai_analysis = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default="pending")  # pending, accepted, rejected
 
+    # Hashes of the job and candidate text ai_analysis was computed from
+    job_hash = Column(String(64), nullable=True)
+    candidate_hash = Column(String(64), nullable=True)
+
     # Relations
     job = relationship("JobPosting", backref="matches")
     candidate = relationship("Candidate", backref="matches")
+
+
+class EmailClassification(Base):
+    """Outcome of job/candidate classification for one email"""
+
+    __tablename__ = "email_classifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    email_id = Column(
+        Integer,
+        ForeignKey("emails.id", ondelete="CASCADE"),
+        unique=True,
+        nullable=False,
+    )
+    result = Column(String)  # job_posting, candidate_profile, other
+    confidence = Column(Float)
+    model_version = Column(String)
+    extracted_info = Column(Text, nullable=True)  # JSON
+    # Keyword prefilter score; NULL when the prefilter didn't run
+    prefilter_score = Column(Float, nullable=True)
+    classified_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relations
+    email = relationship(
+        "Email", backref=backref("classification", uselist=False, passive_deletes=True)
+    )
+
+
+class Task(Base):
+    """A long-running job executed by task_worker.py"""
+
+    __tablename__ = "tasks"
+    __table_args__ = (Index("ix_tasks_status_created_at", "status", "created_at"),)
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, default="queued")  # queued, running, succeeded, failed, cancelled
+    params = Column(Text, nullable=True)  # JSON
+    result = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    progress_current = Column(Integer, default=0)
+    progress_total = Column(Integer, nullable=True)
+    cancel_requested = Column(Boolean, default=False)
+    attempts = Column(Integer, default=0)  # claims, including stale reclaims
+    worker = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,109 @@
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+from models import Email, EmailFingerprint, EmailLshBucket
+import hashlib
+import re
+import zlib
+
+NUM_PERM = 128
+# 16 bands x 8 rows: pairs above ~0.7 Jaccard almost always share a bucket
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+# Shorter bodies ("Thanks!", "No content") collapse to one shingle and would
+# all match each other, so they are never deduplicated
+MIN_WORDS = 2 * SHINGLE_SIZE
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Quoted replies and signatures differ between copies of the same message
+_QUOTED_LINE = re.compile(r"^\s*>.*$", re.M)
+_WORD = re.compile(r"\w+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(_QUOTED_LINE.sub("", text or "").lower())
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> List[str]:
+    """Overlapping word k-grams of the normalized text"""
+    words = _words(text)
+    if len(words) <= size:
+        return [" ".join(words)]
+    return [" ".join(words[i : i + size]) for i in range(len(words) - size + 1)]
+
+
+class NearDuplicateIndex:
+    """MinHash LSH over email bodies, persisted in email_fingerprints/email_lsh_buckets"""
+
+    def __init__(self, threshold: float = 0.85, seed: int = 1):
+        import numpy as np
+
+        self.threshold = threshold
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+        self._b = generator.randint(0, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+
+    def signature(self, text: str):
+        """MinHash signature, or None when the text is too short to compare"""
+        import numpy as np
+
+        if len(_words(text)) < MIN_WORDS:
+            return None
+
+        hashes = np.array(
+            [zlib.crc32(shingle.encode("utf-8")) for shingle in set(shingles(text))],
+            dtype=np.uint64,
+        )
+        # Universal hashing; uint64 wrap-around is fine for MinHash
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def bucket_keys(signature) -> List[str]:
+        keys = []
+        for band in range(BANDS):
+            rows = signature[band * ROWS : (band + 1) * ROWS].tobytes()
+            keys.append(f"{band}:{hashlib.sha1(rows).hexdigest()[:16]}")
+        return keys
+
+    @staticmethod
+    def similarity(left, right) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return float((left == right).mean())
+
+    def find_duplicate(self, db: Session, signature) -> Optional[Tuple[int, float]]:
+        """(canonical email id, similarity) of the closest near-duplicate, if any"""
+        import numpy as np
+
+        candidate_ids = {
+            email_id
+            for (email_id,) in db.query(EmailLshBucket.email_id).filter(
+                EmailLshBucket.bucket.in_(self.bucket_keys(signature))
+            )
+        }
+        if not candidate_ids:
+            return None
+
+        best = None
+        for fingerprint in db.query(EmailFingerprint).filter(
+            EmailFingerprint.email_id.in_(candidate_ids)
+        ):
+            score = self.similarity(
+                signature, np.frombuffer(fingerprint.signature, dtype=np.uint32)
+            )
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (fingerprint.email_id, score)
+        return best
+
+    def add(self, db: Session, email: Email, signature):
+        """Store the fingerprint; only canonical emails are put into buckets"""
+        db.add(EmailFingerprint(email_id=email.id, signature=signature.tobytes()))
+        if email.duplicate_of_id is None:
+            db.add_all(
+                EmailLshBucket(bucket=key, email_id=email.id)
+                for key in self.bucket_keys(signature)
+            )
+        # Later emails in the same batch must see these buckets
+        db.flush()
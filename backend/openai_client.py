@@ -0,0 +1,241 @@
+from typing import Dict, Optional
+import asyncio
+import logging
+import random
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Fallback for models missing from settings.openai_model_limits
+DEFAULT_LIMITS = {"rpm": 500, "tpm": 200000}
+
+class TokenBucket:
+    """Refills continuously at rate_per_minute up to one minute of capacity"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        # Oversized requests wait for a full bucket rather than forever
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, amount: float):
+        """Return (positive) or charge (negative) tokens after the fact"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ModelStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_latency_ms": round(1000 * self.total_latency / self.calls, 1)
+            if self.calls
+            else 0.0,
+            "max_latency_ms": round(1000 * self.max_latency, 1),
+        }
+
+
+def estimate_tokens(kwargs: Dict) -> int:
+    """Rough token count (~4 chars per token) used to reserve TPM budget"""
+    if "messages" in kwargs:
+        chars = sum(len(str(m.get("content") or "")) for m in kwargs["messages"])
+        # Completion tokens count against the TPM limit too
+        completion = kwargs.get("max_tokens") or 500
+    else:
+        inputs = kwargs.get("input") or ""
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        chars = sum(len(str(text)) for text in inputs)
+        completion = 0
+    return chars // 4 + 1 + completion
+
+
+class _Endpoint:
+    """Mimics client.chat.completions / client.embeddings so call sites don't change"""
+
+    def __init__(self, client: "RateLimitedOpenAI", path: str):
+        self._client = client
+        self._path = path
+
+    async def create(self, **kwargs):
+        return await self._client._call(self._path, **kwargs)
+
+
+class _Chat:
+    def __init__(self, client: "RateLimitedOpenAI"):
+        self.completions = _Endpoint(client, "chat.completions")
+
+
+class RateLimitedOpenAI:
+    """AsyncOpenAI wrapper shared by every caller in the process.
+
+    Applies per-model request and token buckets, a global in-flight cap and
+    jittered exponential backoff on 429/5xx, and keeps per-model accounting.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        model_limits: Optional[Dict[str, Dict[str, int]]] = None,
+        limit_share: float = 1.0,
+        max_in_flight: int = 16,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        # Imported here to keep the openai SDK off the startup path
+        from openai import (
+            AsyncOpenAI,
+            APIConnectionError,
+            APITimeoutError,
+            InternalServerError,
+            RateLimitError,
+        )
+
+        # Retries are handled here so they also go through the buckets
+        self._client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self._rate_limit_error = RateLimitError
+        self._retryable_errors = (
+            RateLimitError,
+            APIConnectionError,
+            APITimeoutError,
+            InternalServerError,
+        )
+        self.model_limits = model_limits or {}
+        self.limit_share = limit_share
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.request_buckets: Dict[str, TokenBucket] = {}
+        self.token_buckets: Dict[str, TokenBucket] = {}
+        self.model_stats: Dict[str, ModelStats] = {}
+        self.chat = _Chat(self)
+        self.embeddings = _Endpoint(self, "embeddings")
+
+    def _buckets(self, model: str):
+        if model not in self.request_buckets:
+            limits = {**DEFAULT_LIMITS, **self.model_limits.get(model, {})}
+            self.request_buckets[model] = TokenBucket(limits["rpm"] * self.limit_share)
+            self.token_buckets[model] = TokenBucket(limits["tpm"] * self.limit_share)
+            self.model_stats[model] = ModelStats()
+        return self.request_buckets[model], self.token_buckets[model]
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, self.base_delay)
+            except ValueError:
+                pass
+        # Full jitter keeps concurrent retries from re-synchronising
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    async def _call(self, path: str, **kwargs):
+        model = kwargs.get("model", "")
+        request_bucket, token_bucket = self._buckets(model)
+        stats = self.model_stats[model]
+        method = (
+            self._client.chat.completions.create
+            if path == "chat.completions"
+            else self._client.embeddings.create
+        )
+        estimated = estimate_tokens(kwargs)
+        latency_histogram = (
+            metrics.LLM_LATENCY
+            if path == "chat.completions"
+            else metrics.EMBEDDING_LATENCY
+        )
+
+        attempt = 0
+        while True:
+            await request_bucket.acquire()
+            await token_bucket.acquire(estimated)
+            started = time.perf_counter()
+            try:
+                async with self.in_flight:
+                    response = await method(**kwargs)
+            except self._retryable_errors as e:
+                metrics.OPENAI_ERRORS.inc(model=model, error=type(e).__name__)
+                if isinstance(e, self._rate_limit_error):
+                    stats.rate_limited += 1
+                if attempt >= self.max_retries:
+                    stats.errors += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                stats.retries += 1
+                logger.warning(
+                    f"OpenAI {path} ({model}) failed with {type(e).__name__}; "
+                    f"retry {attempt}/{self.max_retries} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                metrics.OPENAI_ERRORS.inc(model=model, error=type(e).__name__)
+                stats.errors += 1
+                raise
+
+            latency = time.perf_counter() - started
+            latency_histogram.observe(latency, model=model)
+            stats.calls += 1
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+                completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+                stats.prompt_tokens += prompt_tokens
+                stats.completion_tokens += completion_tokens
+                metrics.OPENAI_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+                metrics.OPENAI_TOKENS.inc(
+                    completion_tokens, model=model, kind="completion"
+                )
+                # Settle the reservation against what was actually used
+                token_bucket.adjust(estimated - prompt_tokens - completion_tokens)
+            return response
+
+    def stats(self) -> Dict:
+        return {model: stats.as_dict() for model, stats in self.model_stats.items()}
+
+    async def close(self):
+        await self._client.close()
@@ -0,0 +1,92 @@
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import logging
+import time
+
+import metrics
+
+logger = logging.getLogger("slow_query")
+
+
+class QueryStats:
+    """SQL statistics collected for a single request"""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: Optional[str] = None
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+    def as_headers(self) -> dict:
+        return {
+            "X-DB-Query-Count": str(self.count),
+            "X-DB-Time-Ms": f"{self.total_time * 1000:.2f}",
+            "X-DB-Slowest-Ms": f"{self.slowest_time * 1000:.2f}",
+        }
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "query_stats", default=None
+)
+
+
+def begin_request(label: str = ""):
+    """Start collecting stats for the current request; returns (stats, token)"""
+    stats = QueryStats(label)
+    return stats, _current_stats.set(stats)
+
+
+def end_request(token):
+    """Stop collecting stats for the current request"""
+    _current_stats.reset(token)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+def install(engine: Engine, slow_query_threshold_ms: float):
+    """Attach timing hooks to the engine and log statements over the threshold"""
+    threshold = slow_query_threshold_ms / 1000
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        context._query_start_time = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - context._query_start_time
+        metrics.DB_LATENCY.observe(elapsed)
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+        if elapsed >= threshold:
+            logger.warning(
+                "%.1f ms%s: %s",
+                elapsed * 1000,
+                f" [{stats.label}]" if stats and stats.label else "",
+                " ".join(statement.split()),
+            )
+
+
+def check_query_count(stats: QueryStats, limit: int):
+    """Log requests whose statement count suggests an N+1 pattern"""
+    if limit and stats.count > limit:
+        logger.warning(
+            "%s issued %d queries (%.1f ms total); slowest %.1f ms: %s",
+            stats.label,
+            stats.count,
+            stats.total_time * 1000,
+            stats.slowest_time * 1000,
+            " ".join((stats.slowest_statement or "").split()),
+        )
@@ -0,0 +1,206 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+from models import Email, Task
+from vector_store import VectorStore
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "reply_pairs"
+
+
+def pair_id(question_email_id: int) -> str:
+    return f"pair_{question_email_id}"
+
+
+def thread_reply_pairs(emails: List[Email]) -> List[Tuple[Email, Email]]:
+    """(question, reply) pairs for one thread's emails in received order.
+
+    An explicit reply (parent_id) wins; otherwise the next message in the
+    thread from someone other than the question's sender is the answer.
+    """
+    pairs = []
+    for index, question in enumerate(emails):
+        later = emails[index + 1 :]
+        reply = next(
+            (email for email in later if email.parent_id == question.id), None
+        )
+        if reply is None:
+            reply = next(
+                (
+                    email
+                    for email in later
+                    if email.sender != question.sender
+                    and email.parent_id in (None, question.id)
+                ),
+                None,
+            )
+        if reply is not None:
+            pairs.append((question, reply))
+    return pairs
+
+
+class ReplyIndex:
+    """Vectors of past questions, each pointing at the reply that was sent"""
+
+    def __init__(self, vector_store: VectorStore):
+        self.vector_store = vector_store
+        self.collection = vector_store.client.get_or_create_collection(
+            name=COLLECTION_NAME, metadata={"hnsw:space": "cosine"}
+        )
+
+    async def _question_vectors(self, questions: List[Email]) -> List[List[float]]:
+        """Reuse each question's stored email vector; embed only when missing"""
+        embedding_ids = {
+            email.id: email.embedding_id
+            or (email.duplicate_of.embedding_id if email.duplicate_of else None)
+            for email in questions
+        }
+        stored = await self.vector_store.get_embeddings(
+            [embedding_id for embedding_id in embedding_ids.values() if embedding_id]
+        )
+        missing = [
+            email for email in questions if embedding_ids[email.id] not in stored
+        ]
+        embedded = dict(
+            zip(
+                (email.id for email in missing),
+                await self.vector_store._get_embeddings(
+                    [email.content or "" for email in missing]
+                ),
+            )
+        )
+        return [
+            embedded.get(email.id) or stored[embedding_ids[email.id]]
+            for email in questions
+        ]
+
+    async def _upsert(self, pairs: List[Tuple[Email, Email]]):
+        if not pairs:
+            return
+        questions = [question for question, _ in pairs]
+        vectors = await self._question_vectors(questions)
+        await asyncio.to_thread(
+            self.collection.upsert,
+            ids=[pair_id(question.id) for question in questions],
+            embeddings=vectors,
+            metadatas=[
+                {
+                    "question_email_id": question.id,
+                    "reply_email_id": reply.id,
+                    "thread_id": question.thread_id or "",
+                }
+                for question, reply in pairs
+            ],
+        )
+
+    def _thread_emails(
+        self, db: Session, thread_ids: Iterable[str]
+    ) -> Dict[str, List[Email]]:
+        emails = (
+            db.query(Email)
+            .filter(Email.thread_id.in_(list(thread_ids)))
+            .options(selectinload(Email.body))
+            .order_by(Email.thread_id, Email.received_date, Email.id)
+            .all()
+        )
+        threads: Dict[str, List[Email]] = {}
+        for email in emails:
+            threads.setdefault(email.thread_id, []).append(email)
+        return threads
+
+    def version(self, db: Session) -> Tuple:
+        """Changes whenever the index may have: new mail or a finished rebuild.
+
+        Read from SQL because ingestion and rebuilds run in the task worker,
+        not in the API process that caches answers.
+        """
+        latest_email_id = db.query(func.max(Email.id)).scalar()
+        latest_rebuild = (
+            db.query(func.max(Task.finished_at))
+            .filter(Task.kind == "rebuild_reply_index")
+            .scalar()
+        )
+        return latest_email_id, latest_rebuild
+
+    async def index_threads(self, db: Session, thread_ids: Iterable[str]) -> int:
+        """Recompute pairs for threads that just received mail; returns pair count"""
+        thread_ids = {thread_id for thread_id in thread_ids if thread_id}
+        if not thread_ids:
+            return 0
+        pairs = []
+        for emails in self._thread_emails(db, thread_ids).values():
+            pairs.extend(thread_reply_pairs(emails))
+        await self._upsert(pairs)
+        return len(pairs)
+
+    async def rebuild(
+        self,
+        db: Session,
+        batch_size: int = 200,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> int:
+        """Drop and rebuild the whole index from the emails table"""
+        client = self.vector_store.client
+        try:
+            client.delete_collection(COLLECTION_NAME)
+        except Exception:
+            pass  # Collection might not exist
+        self.collection = client.get_or_create_collection(
+            name=COLLECTION_NAME, metadata={"hnsw:space": "cosine"}
+        )
+
+        thread_ids = [
+            thread_id
+            for (thread_id,) in db.query(Email.thread_id)
+            .filter(Email.thread_id.isnot(None))
+            .distinct()
+            .order_by(Email.thread_id)
+        ]
+        total = 0
+        for start in range(0, len(thread_ids), batch_size):
+            batch = thread_ids[start : start + batch_size]
+            total += await self.index_threads(db, batch)
+            # Keep the identity map from growing with every thread
+            db.expunge_all()
+            if progress:
+                progress(min(start + batch_size, len(thread_ids)), len(thread_ids))
+        logger.info(f"Rebuilt reply index with {total} pairs")
+        return total
+
+    async def email_vector(self, email: Email) -> List[float]:
+        """The email's stored vector (embedded only if it was never stored)"""
+        vectors = await self._question_vectors([email])
+        return vectors[0]
+
+    async def find_replies(
+        self, email: Email, n_results: int = 3, vector: Optional[List[float]] = None
+    ) -> List[Dict]:
+        """Closest past questions to `email`, best first, with their reply IDs.
+
+        Uses the email's stored vector, so this is a single vector query.
+        """
+        if vector is None:
+            vector = await self.email_vector(email)
+        results = await asyncio.to_thread(
+            self.collection.query,
+            query_embeddings=[vector],
+            n_results=n_results,
+            # Answers from the email's own thread would just echo the conversation
+            where={"thread_id": {"$ne": email.thread_id or ""}},
+            include=["metadatas", "distances"],
+        )
+        if not results["metadatas"]:
+            return []
+        return [
+            {
+                "question_email_id": metadata["question_email_id"],
+                "reply_email_id": metadata["reply_email_id"],
+                "similarity_score": 1 - distance,
+            }
+            for metadata, distance in zip(
+                results["metadatas"][0], results["distances"][0]
+            )
+        ]
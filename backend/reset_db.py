@@ -1,7 +1,6 @@
 from database import SessionLocal, init_db
 from models import Email, EmailThread, JobPosting, Candidate, Match
-from vector_store import VectorStore
-from config import Settings
+from services import services
 
 
 def reset_database():
@@ -24,8 +23,7 @@ def reset_database():
 
     # Reset ChromaDB collection
     print("Resetting ChromaDB collection...")
-    vector_store = VectorStore(Settings())
-    vector_store.clear_collection()
+    services.vector_store.clear_collection()
 
     print("Database reset complete!")
 
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, List, Optional
 
 
 class EmailBase(BaseModel):
@@ -21,10 +21,12 @@ class EmailResponse(EmailBase):
     id: int
     message_id: str
     received_date: datetime
-    embedding_id: str
+    embedding_id: Optional[str] = None
+    duplicate_of_id: Optional[int] = None
     importance_score: float
     is_processed: bool
     category: Optional[str] = None
+    scored_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -55,3 +57,18 @@ class ThreadResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class TaskResponse(BaseModel):
+    id: str
+    kind: str
+    status: str
+    progress_current: int
+    progress_total: Optional[int] = None
+    cancel_requested: bool
+    attempts: int = 0
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import hashlib
+import time
+
+import metrics
+
+
+def content_key(text: Optional[str]) -> str:
+    """Hash of whitespace/case-normalized text for exact-duplicate lookups"""
+    normalized = " ".join((text or "").lower().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class SemanticCache:
+    """In-process cache of recent answers keyed by query embedding.
+
+    An exact content-hash match is checked first; otherwise the entry whose
+    vector has the highest cosine similarity above `threshold` is served.
+    Entries expire after `ttl_seconds`; the oldest are evicted beyond
+    `max_entries`. Passing a different `version` to get() clears the cache,
+    for when the data the answers came from has changed.
+    """
+
+    def __init__(
+        self,
+        name: str = "semantic",
+        threshold: float = 0.97,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1000,
+    ):
+        self.name = name
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # key -> (expires_at, vector, value), oldest first
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._matrix = None  # normalized vectors, rebuilt lazily
+        self._matrix_keys: List[str] = []
+        self._version: Any = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _purge_expired(self, now: float):
+        expired = [key for key, entry in self._entries.items() if entry[0] <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _build_matrix(self):
+        import numpy as np
+
+        self._matrix_keys = list(self._entries)
+        vectors = np.array(
+            [self._entries[key][1] for key in self._matrix_keys], dtype=np.float32
+        )
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self._matrix = vectors / np.maximum(norms, 1e-12)
+
+    def get(
+        self,
+        key: str,
+        vector: Optional[List[float]] = None,
+        accept: Optional[Callable[[Any], bool]] = None,
+        version: Any = None,
+    ) -> Optional[Any]:
+        """Cached value for an exact key, else for the nearest vector.
+
+        Values rejected by `accept` are skipped; a lookup that serves nothing
+        counts as a miss.
+        """
+        import numpy as np
+
+        if version is not None and version != self._version:
+            self.clear()
+            self._version = version
+
+        now = time.monotonic()
+        self._purge_expired(now)
+
+        entry = self._entries.get(key)
+        if entry is not None and (accept is None or accept(entry[2])):
+            self.exact_hits += 1
+            metrics.CACHE_LOOKUPS.inc(cache=self.name, result="exact_hit")
+            return entry[2]
+
+        if vector is not None and self._entries:
+            if self._matrix is None:
+                self._build_matrix()
+            query = np.asarray(vector, dtype=np.float32)
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+            similarities = self._matrix @ query
+            # Most similar first, stopping at the threshold
+            for index in np.argsort(-similarities):
+                if similarities[index] < self.threshold:
+                    break
+                value = self._entries[self._matrix_keys[index]][2]
+                if accept is None or accept(value):
+                    self.semantic_hits += 1
+                    metrics.CACHE_LOOKUPS.inc(cache=self.name, result="semantic_hit")
+                    return value
+
+        self.misses += 1
+        metrics.CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+        return None
+
+    def put(self, key: str, vector: List[float], value: Any):
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, vector, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def clear(self):
+        self._entries.clear()
+        self._matrix = None
+
+    def stats(self) -> Dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,196 @@
+from functools import cached_property
+from config import Settings
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# pg advisory lock key, so one process backfills vector metadata at startup
+VECTOR_METADATA_LOCK_ID = 0x6D657461
+
+# Attributes dropped on shutdown so the next access rebuilds them
+_SERVICE_ATTRS = (
+    "vector_store",
+    "openai_client",
+    "job_matcher",
+    "batch_matcher",
+    "job_extractor",
+    "email_processor",
+    "reply_index",
+    "auto_reply_cache",
+    "near_duplicates",
+    "threading_engine",
+    "email_scorer",
+)
+
+
+class Services:
+    """Process-wide owner of the expensive clients.
+
+    Everything is built on first access, so importing a route module no
+    longer opens a Chroma client or an HTTP pool.
+    """
+
+    def __init__(self, settings: Settings = None, openai_client=None):
+        self._settings = settings
+        # Injected client, e.g. fake_openai.FakeOpenAI for benchmarks
+        self._openai_client = openai_client
+
+    @cached_property
+    def settings(self) -> Settings:
+        return self._settings or Settings()
+
+    @property
+    def engine(self):
+        from database import engine
+
+        return engine
+
+    @cached_property
+    def openai_client(self):
+        if self._openai_client is not None:
+            return self._openai_client
+        from openai_client import RateLimitedOpenAI
+
+        return RateLimitedOpenAI(
+            self.settings.openai_api_key,
+            base_url=self.settings.openai_base_url,
+            model_limits=self.settings.openai_model_limits,
+            limit_share=self.settings.openai_limit_share,
+            max_in_flight=self.settings.openai_max_in_flight,
+            max_retries=self.settings.openai_max_retries,
+        )
+
+    @cached_property
+    def vector_store(self):
+        from vector_store import VectorStore
+
+        return VectorStore(self.settings, self.openai_client)
+
+    @cached_property
+    def job_matcher(self):
+        from job_matcher import JobMatcher
+
+        return JobMatcher(
+            self.vector_store,
+            self.openai_client,
+            max_concurrency=self.settings.match_analysis_concurrency,
+            batch_analysis=self.settings.batch_match_analysis,
+        )
+
+    @cached_property
+    def batch_matcher(self):
+        from batch_matcher import BatchMatcher
+
+        return BatchMatcher(
+            self.vector_store,
+            self.job_matcher,
+            top_k=self.settings.batch_match_top_k,
+            analyze_top=self.settings.batch_match_analyze_top,
+        )
+
+    @cached_property
+    def job_extractor(self):
+        from job_extractor import JobExtractor
+        from email_prefilter import EmailPrefilter
+
+        return JobExtractor(
+            self.vector_store,
+            self.openai_client,
+            max_concurrency=self.settings.classification_concurrency,
+            batch_size=self.settings.classification_batch_size,
+            prefilter=(
+                EmailPrefilter(self.settings.prefilter_threshold)
+                if self.settings.prefilter_enabled
+                else None
+            ),
+            rules_min_confidence=self.settings.rule_extraction_min_confidence,
+        )
+
+    @cached_property
+    def reply_index(self):
+        from reply_index import ReplyIndex
+
+        return ReplyIndex(self.vector_store)
+
+    @cached_property
+    def auto_reply_cache(self):
+        from semantic_cache import SemanticCache
+
+        return SemanticCache(
+            name="auto_reply",
+            threshold=self.settings.auto_reply_cache_threshold,
+            ttl_seconds=self.settings.auto_reply_cache_ttl_seconds,
+            max_entries=self.settings.auto_reply_cache_max_entries,
+        )
+
+    @cached_property
+    def near_duplicates(self):
+        if not self.settings.near_duplicate_enabled:
+            return None
+        from near_duplicates import NearDuplicateIndex
+
+        return NearDuplicateIndex(self.settings.near_duplicate_threshold)
+
+    @cached_property
+    def threading_engine(self):
+        from email_threading import ThreadingEngine
+
+        return ThreadingEngine(self.vector_store, self.reply_index)
+
+    @cached_property
+    def email_scorer(self):
+        from email_scoring import EmailScorer
+
+        return EmailScorer(
+            self.vector_store,
+            block_size=self.settings.scoring_block_size,
+            min_category_similarity=self.settings.scoring_min_category_similarity,
+        )
+
+    @cached_property
+    def email_processor(self):
+        from email_processor import EmailProcessor
+
+        return EmailProcessor(
+            self.settings,
+            self.vector_store,
+            self.reply_index,
+            self.near_duplicates,
+            self.threading_engine,
+        )
+
+    async def startup(self):
+        """Open the vector store up front so the first request doesn't pay for it"""
+        self.vector_store
+        await asyncio.to_thread(self._backfill_vector_metadata)
+        logger.info("Services started")
+
+    def _backfill_vector_metadata(self):
+        """One-time sync for job/candidate vectors stored without filter metadata.
+
+        Without it the status and location pre-filters match none of them.
+        """
+        from database import SessionLocal, advisory_lock
+
+        with advisory_lock(VECTOR_METADATA_LOCK_ID) as locked:
+            if not locked or not self.job_matcher.vector_metadata_outdated():
+                return
+            db = SessionLocal()
+            try:
+                updated = self.job_matcher.sync_vector_metadata(db)
+            finally:
+                db.close()
+        logger.info(f"Backfilled matching metadata for {updated} vectors")
+
+    async def shutdown(self):
+        """Close network clients and dispose of the DB connection pool"""
+        if "openai_client" in self.__dict__:
+            await self.openai_client.close()
+        self.engine.dispose()
+        for name in _SERVICE_ATTRS:
+            self.__dict__.pop(name, None)
+        logger.info("Services shut down")
+
+
+services = Services()
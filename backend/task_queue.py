@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Task
+import json
+import logging
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task once cancellation has been requested"""
+
+
+def enqueue(db: Session, kind: str, params: Optional[Dict] = None) -> Task:
+    """Persist a queued task and return it"""
+    task = Task(
+        id=str(uuid.uuid4()),
+        kind=kind,
+        status="queued",
+        params=json.dumps(params or {}),
+        progress_current=0,
+        cancel_requested=False,
+        attempts=0,
+    )
+    db.add(task)
+    db.commit()
+    return task
+
+
+def request_cancel(db: Session, task: Task) -> Task:
+    """Cancel a queued task now, or ask its worker to stop a running one"""
+    if task.status == "queued":
+        task.status = "cancelled"
+        task.finished_at = datetime.utcnow()
+    elif task.status == "running":
+        task.cancel_requested = True
+    db.commit()
+    return task
+
+
+def task_to_dict(task: Task) -> Dict:
+    return {
+        "id": task.id,
+        "kind": task.kind,
+        "status": task.status,
+        "progress_current": task.progress_current or 0,
+        "progress_total": task.progress_total,
+        "cancel_requested": bool(task.cancel_requested),
+        "attempts": task.attempts or 0,
+        "result": json.loads(task.result) if task.result else None,
+        "error": task.error,
+        "created_at": task.created_at,
+        "started_at": task.started_at,
+        "finished_at": task.finished_at,
+    }
+
+
+def claim_next(
+    db: Session, worker: str, stale_after_seconds: int, max_attempts: int = 3
+) -> Optional[Task]:
+    """Atomically take the oldest queued task (or one whose worker died).
+
+    A stale task that has already been claimed max_attempts times is marked
+    failed instead, so a task that kills its worker isn't retried forever.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=stale_after_seconds)
+    while True:
+        task = (
+            db.query(Task)
+            .filter(
+                or_(
+                    Task.status == "queued",
+                    and_(Task.status == "running", Task.heartbeat_at < stale_before),
+                )
+            )
+            .order_by(Task.created_at)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if task is None:
+            db.rollback()
+            return None
+        if (task.attempts or 0) < max_attempts:
+            break
+
+        task.status = "failed"
+        task.error = f"Worker stopped responding on all {task.attempts} attempts"
+        task.finished_at = datetime.utcnow()
+        db.commit()
+        logger.error(f"Task {task.id} ({task.kind}) failed: {task.error}")
+
+    now = datetime.utcnow()
+    task.attempts = (task.attempts or 0) + 1
+    task.status = "running"
+    task.worker = worker
+    task.started_at = now
+    task.heartbeat_at = now
+    db.commit()
+    return task
+
+
+class TaskContext:
+    """Progress reporting and cancellation for a running task.
+
+    Uses its own session so progress is visible while the task's work is
+    still uncommitted.
+    """
+
+    def __init__(self, task_id: str, min_interval: float = 1.0):
+        self.task_id = task_id
+        self.min_interval = timedelta(seconds=min_interval)
+        self._last_write = datetime.min
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def _update(self, **values) -> bool:
+        """Write values and return whether cancellation was requested"""
+        db = SessionLocal()
+        try:
+            task = db.query(Task).filter(Task.id == self.task_id).first()
+            for key, value in values.items():
+                setattr(task, key, value)
+            task.heartbeat_at = datetime.utcnow()
+            db.commit()
+            return bool(task.cancel_requested)
+        finally:
+            db.close()
+
+    def _beat(self, interval: float):
+        while not self._heartbeat_stop.wait(interval):
+            try:
+                self._update()
+            except Exception as e:
+                logger.warning(f"Heartbeat for task {self.task_id} failed: {e}")
+
+    def start_heartbeat(self, interval: float):
+        """Refresh heartbeat_at every `interval` seconds until stopped.
+
+        A thread rather than an asyncio task, so handlers that block the
+        event loop (IMAP fetches, numpy, sync SQL) still look alive and
+        claim_next doesn't hand the task to a second worker.
+        """
+        self._heartbeat_thread = threading.Thread(
+            target=self._beat, args=(interval,), daemon=True
+        )
+        self._heartbeat_thread.start()
+
+    def stop_heartbeat(self):
+        self._heartbeat_stop.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+
+    def progress(self, current: int, total: Optional[int] = None):
+        """Record progress; raises TaskCancelled if a cancel was requested"""
+        now = datetime.utcnow()
+        if now - self._last_write < self.min_interval and current != total:
+            return
+        self._last_write = now
+        values = {"progress_current": current}
+        if total is not None:
+            values["progress_total"] = total
+        if self._update(**values):
+            raise TaskCancelled()
+
+    def finish(self, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        self._update(
+            status=status,
+            result=json.dumps(result, default=str) if result is not None else None,
+            error=error,
+            finished_at=datetime.utcnow(),
+        )
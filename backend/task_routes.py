@@ -0,0 +1,42 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from database import get_db
+from models import Task
+from schemas import TaskResponse
+from task_queue import request_cancel, task_to_dict
+
+router = APIRouter(prefix="/tasks", tags=["tasks"])
+
+
+@router.get("/", response_model=List[TaskResponse])
+async def list_tasks(
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+):
+    """List tasks, newest first"""
+    query = db.query(Task)
+    if status:
+        query = query.filter(Task.status == status)
+    tasks = query.order_by(Task.created_at.desc()).offset(skip).limit(limit).all()
+    return [task_to_dict(task) for task in tasks]
+
+
+@router.get("/{task_id}", response_model=TaskResponse)
+async def get_task(task_id: str, db: Session = Depends(get_db)):
+    """Get a task's status, progress and result"""
+    task = db.query(Task).filter(Task.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task_to_dict(task)
+
+
+@router.post("/{task_id}/cancel", response_model=TaskResponse)
+async def cancel_task(task_id: str, db: Session = Depends(get_db)):
+    """Cancel a queued task, or ask the worker to stop a running one"""
+    task = db.query(Task).filter(Task.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task_to_dict(request_cancel(db, task))
@@ -0,0 +1,158 @@
+"""Runs queued tasks from the tasks table in dedicated worker processes.
+
+Usage: python task_worker.py [--processes N] [--metrics-port PORT]
+"""
+from typing import Dict, Optional
+from database import SessionLocal
+from email_archive import run_archiver
+from services import Services, services
+from task_queue import TaskCancelled, TaskContext, claim_next, enqueue
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+
+logger = logging.getLogger(__name__)
+
+
+class TaskWorker:
+    def __init__(self, container: Services):
+        self.services = container
+        self.settings = container.settings
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.handlers = {
+            "process_emails": self.process_emails,
+            "reprocess_embeddings": self.reprocess_embeddings,
+            "refresh_jobs": self.refresh_jobs,
+            "match_all": self.match_all,
+            "rebuild_reply_index": self.rebuild_reply_index,
+            "score_emails": self.score_emails,
+        }
+
+    async def process_emails(self, db, ctx: TaskContext, params: Dict) -> Dict:
+        processed = await self.services.email_processor.process_all_emails(
+            db, progress=ctx.progress
+        )
+        # Scored as its own task so a scoring failure can't fail the ingest
+        scoring_task = enqueue(db, "score_emails", {"full": False})
+        return {
+            "message": f"Processed {len(processed)} emails",
+            "scoring_task_id": scoring_task.id,
+        }
+
+    async def reprocess_embeddings(self, db, ctx: TaskContext, params: Dict) -> Dict:
+        count = await self.services.vector_store.reembed_emails(db, progress=ctx.progress)
+        return {"message": f"Reprocessed {count} emails with new embeddings"}
+
+    async def refresh_jobs(self, db, ctx: TaskContext, params: Dict) -> Dict:
+        stats = await self.services.job_extractor.refresh(
+            db,
+            params.get("recheck_prefiltered", False),
+            progress=ctx.progress,
+        )
+        return {
+            "message": f"Processed {stats['emails_processed']} new emails. Created {stats['jobs_created']} jobs and {stats['candidates_created']} candidates.",
+            **stats,
+        }
+
+    async def match_all(self, db, ctx: TaskContext, params: Dict) -> Dict:
+        return await self.services.batch_matcher.run(db, progress=ctx.progress)
+
+    async def rebuild_reply_index(self, db, ctx: TaskContext, params: Dict) -> Dict:
+        pairs = await self.services.reply_index.rebuild(db, progress=ctx.progress)
+        return {"message": f"Indexed {pairs} question/reply pairs"}
+
+    async def score_emails(self, db, ctx: TaskContext, params: Dict) -> Dict:
+        return await self.services.email_scorer.run(
+            db, full=params.get("full", False), progress=ctx.progress
+        )
+
+    async def run_one(self) -> bool:
+        """Claim and run a single task; returns False when the queue is empty"""
+        db = SessionLocal()
+        try:
+            task = claim_next(
+                db,
+                self.name,
+                self.settings.task_stale_after_seconds,
+                self.settings.task_max_attempts,
+            )
+            if task is None:
+                return False
+
+            ctx = TaskContext(task.id)
+            handler = self.handlers.get(task.kind)
+            logger.info(f"Running task {task.id} ({task.kind})")
+            # Well inside the stale window even if progress() is never called
+            ctx.start_heartbeat(self.settings.task_stale_after_seconds / 5)
+            try:
+                if handler is None:
+                    raise ValueError(f"Unknown task kind: {task.kind}")
+                try:
+                    result = await handler(db, ctx, json.loads(task.params or "{}"))
+                finally:
+                    ctx.stop_heartbeat()
+                ctx.finish("succeeded", result=result)
+            except TaskCancelled:
+                db.rollback()
+                ctx.finish("cancelled")
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Task {task.id} failed: {str(e)}")
+                ctx.finish("failed", error=str(e))
+            return True
+        finally:
+            db.close()
+
+    async def run(self):
+        await self.services.startup()
+        archiver = asyncio.create_task(run_archiver(self.settings))
+        try:
+            while True:
+                if not await self.run_one():
+                    await asyncio.sleep(self.settings.task_poll_interval_seconds)
+        finally:
+            archiver.cancel()
+            await self.services.shutdown()
+
+
+def _worker_main(metrics_port: Optional[int] = None):
+    logging.basicConfig(level=logging.INFO)
+    if metrics_port:
+        import metrics
+
+        metrics.serve(metrics_port)
+    worker = TaskWorker(services)
+    logger.info(f"Task worker {worker.name} started")
+    asyncio.run(worker.run())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background task workers")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="serve /metrics here; process i of N listens on PORT + i",
+    )
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        _worker_main(args.metrics_port)
+    else:
+        processes = [
+            multiprocessing.Process(
+                target=_worker_main,
+                args=(args.metrics_port + i if args.metrics_port else None,),
+                daemon=True,
+            )
+            for i in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session, selectinload
+from typing import List
+from database import get_db
+from models import Email, EmailThread
+from schemas import ThreadResponse
+
+router = APIRouter(prefix="/threads", tags=["threads"])
+
+
+@router.get("/", response_model=List[ThreadResponse])
+async def list_threads(skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
+    """List threads, most recently active first, with their emails"""
+    threads = (
+        db.query(EmailThread)
+        .options(selectinload(EmailThread.emails).selectinload(Email.body))
+        .order_by(EmailThread.last_updated.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return threads
+
+
+@router.get("/{thread_id}", response_model=ThreadResponse)
+async def get_thread(thread_id: str, db: Session = Depends(get_db)):
+    """Get a thread and all of its emails in received order"""
+    thread = (
+        db.query(EmailThread)
+        .options(selectinload(EmailThread.emails).selectinload(Email.body))
+        .filter(EmailThread.thread_id == thread_id)
+        .first()
+    )
+    if not thread:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    return thread
@@ -1,24 +1,35 @@
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from chromadb.utils import embedding_functions
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
+import asyncio
 import uuid
 from config import Settings
 from models import Email
-from sqlalchemy.orm import Session
-import numpy as np
-from openai import AsyncOpenAI
+from sqlalchemy.orm import Session, selectinload
+from openai_client import RateLimitedOpenAI
 import json
+import metrics
 
 
 class VectorStore:
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, openai_client: RateLimitedOpenAI):
         self.settings = settings
-        # Initialize ChromaDB with new client format
-        self.client = chromadb.PersistentClient(path=settings.chroma_persist_directory)
+        # chromadb is slow to import, so only load it once a store is built
+        import chromadb
+
+        if settings.chroma_server_host:
+            # Shared server: every API worker talks to one index over HTTP
+            self.client = chromadb.HttpClient(
+                host=settings.chroma_server_host,
+                port=settings.chroma_server_port,
+                ssl=settings.chroma_server_ssl,
+            )
+        else:
+            # Embedded store, only safe with a single process
+            self.client = chromadb.PersistentClient(
+                path=settings.chroma_persist_directory
+            )
 
-        # Initialize OpenAI with new client
-        self.openai_client = AsyncOpenAI(api_key=settings.openai_api_key)
+        # Shared, rate-limited OpenAI client
+        self.openai_client = openai_client
 
         # Get or create collection with correct dimensionality
         try:
@@ -57,22 +68,66 @@ class VectorStore:
         )
         return response.data[0].embedding
 
-    async def add_text(self, text: str, metadata: Dict) -> str:
-        """Add text to vector store and return embedding ID"""
-        embedding_id = str(uuid.uuid4())
-
-        # Get embedding from OpenAI
-        embedding = await self._get_embedding(text)
+    async def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed many texts with one API request per vector_batch_size texts"""
+        embeddings = []
+        batch_size = self.settings.vector_batch_size
+        for start in range(0, len(texts), batch_size):
+            batch = [
+                self._preprocess_text(text)
+                for text in texts[start : start + batch_size]
+            ]
+            response = await self.openai_client.embeddings.create(
+                model="text-embedding-3-small", input=batch, encoding_format="float"
+            )
+            # The API returns items with an index; don't rely on ordering
+            embeddings.extend(
+                item.embedding for item in sorted(response.data, key=lambda d: d.index)
+            )
+        return embeddings
+
+    async def add_texts(self, texts: List[str], metadatas: List[Dict]) -> List[str]:
+        """Add many texts in batched embedding and Chroma calls; returns their IDs"""
+        embedding_ids = [str(uuid.uuid4()) for _ in texts]
+        embeddings = await self._get_embeddings(texts)
+
+        batch_size = self.settings.vector_batch_size
+        for start in range(0, len(texts), batch_size):
+            end = start + batch_size
+            with metrics.VECTOR_LATENCY.time(operation="add"):
+                await asyncio.to_thread(
+                    self.collection.add,
+                    embeddings=embeddings[start:end],
+                    documents=texts[start:end],
+                    metadatas=metadatas[start:end],
+                    ids=embedding_ids[start:end],
+                )
+        return embedding_ids
 
-        # Add to ChromaDB
-        self.collection.add(
-            embeddings=[embedding],
-            documents=[text],
-            metadatas=[metadata],
-            ids=[embedding_id],
-        )
+    async def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        where: Optional[Dict] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict:
+        """Run one Chroma query for any number of query vectors.
+
+        Off the event loop, since in server mode this is a network round trip.
+        """
+        with metrics.VECTOR_LATENCY.time(operation="query"):
+            return await asyncio.to_thread(
+                self.collection.query,
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where,
+                include=include or ["documents", "metadatas", "distances"],
+            )
 
-        return embedding_id
+    async def add_text(self, text: str, metadata: Dict) -> str:
+        """Add text to vector store and return embedding ID"""
+        embedding_ids = await self.add_texts([text], [metadata])
+        return embedding_ids[0]
 
     async def _validate_with_llm(
         self, original_email: Dict, similar_emails: List[Dict]
@@ -180,6 +235,8 @@ Important: Your response must be valid JSON."""
         original_email: Optional[Dict] = None,
     ) -> Dict:
         """Find similar emails using advanced vector similarity search with LLM validation"""
+        import numpy as np
+
         # Initialize variables
         similar_emails = []
         best_match = None
@@ -196,23 +253,17 @@ Important: Your response must be valid JSON."""
             where_filter = {"thread_id": {"$ne": current_thread_id}}
 
         # Search in ChromaDB with thread filter
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results + 1,
-            where=where_filter,
-            include=["documents", "metadatas", "distances"],
+        results = await self.query(
+            [query_embedding], n_results + 1, where=where_filter
         )
 
         if results["documents"]:
-            for i, (doc, metadata, distance) in enumerate(
-                zip(
-                    results["documents"][0],
-                    results["metadatas"][0],
-                    results["distances"][0],
-                )
+            hits = []
+            for doc, metadata, distance in zip(
+                results["documents"][0],
+                results["metadatas"][0],
+                results["distances"][0],
             ):
-                similarity_score = 1 - distance
-
                 email = (
                     db.query(Email)
                     .filter(Email.thread_id == metadata["thread_id"])
@@ -222,10 +273,18 @@ Important: Your response must be valid JSON."""
                 if not email:
                     continue
 
+                hits.append((doc, email, 1 - distance))
+
+            # One embeddings request for all hit subjects
+            subject_embeddings = await self._get_embeddings(
+                [email.subject for _, email, _ in hits]
+            )
+
+            for (doc, email, similarity_score), subject_embedding in zip(
+                hits, subject_embeddings
+            ):
                 length_penalty = min(len(doc.split()) / 100, 1.0)
-                subject_similarity = np.dot(
-                    query_embedding, await self._get_embedding(email.subject)
-                )
+                subject_similarity = np.dot(query_embedding, subject_embedding)
 
                 final_score = (
                     0.6 * similarity_score
@@ -267,20 +326,36 @@ Important: Your response must be valid JSON."""
             "similarity_score": max_similarity,
         }
 
-    def delete_embedding(self, embedding_id: str):
+    async def get_embeddings(self, embedding_ids: List[str]) -> Dict[str, List[float]]:
+        """Fetch stored embeddings by ID without calling the embedding API"""
+        if not embedding_ids:
+            return {}
+        with metrics.VECTOR_LATENCY.time(operation="get"):
+            results = await asyncio.to_thread(
+                self.collection.get, ids=embedding_ids, include=["embeddings"]
+            )
+        return {
+            embedding_id: list(map(float, embedding))
+            for embedding_id, embedding in zip(results["ids"], results["embeddings"])
+        }
+
+    async def delete_embedding(self, embedding_id: str):
         """Delete an embedding from the vector store"""
-        self.collection.delete(ids=[embedding_id])
+        with metrics.VECTOR_LATENCY.time(operation="delete"):
+            await asyncio.to_thread(self.collection.delete, ids=[embedding_id])
 
     async def update_embedding(self, embedding_id: str, text: str, metadata: Dict):
         """Update an existing embedding"""
         embedding = await self._get_embedding(text)
 
-        self.collection.update(
-            ids=[embedding_id],
-            embeddings=[embedding],
-            documents=[text],
-            metadatas=[metadata],
-        )
+        with metrics.VECTOR_LATENCY.time(operation="update"):
+            await asyncio.to_thread(
+                self.collection.update,
+                ids=[embedding_id],
+                embeddings=[embedding],
+                documents=[text],
+                metadatas=[metadata],
+            )
 
     def clear_collection(self):
         """Clear and recreate the collection"""
@@ -295,43 +370,95 @@ Important: Your response must be valid JSON."""
             metadata={"hnsw:space": "cosine"},  # Use cosine similarity
         )
 
+    async def reembed_emails(
+        self,
+        db: Session,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> int:
+        """Replace every email's vector with a fresh embedding.
+
+        Each batch adds the new vectors, commits the new embedding_ids and
+        only then deletes the old vectors. A cancelled or failed run leaves
+        every email pointing at a vector that exists, old or new.
+        """
+        # Near-duplicates share their canonical email's vector
+        emails = (
+            db.query(Email)
+            .filter(Email.duplicate_of_id.is_(None))
+            .options(selectinload(Email.body))
+            .all()
+        )
+
+        batch_size = self.settings.vector_batch_size
+        for start in range(0, len(emails), batch_size):
+            batch = emails[start : start + batch_size]
+            old_ids = [email.embedding_id for email in batch if email.embedding_id]
+            embedding_ids = await self.add_texts(
+                [email.content for email in batch],
+                [
+                    {"subject": email.subject, "thread_id": email.thread_id}
+                    for email in batch
+                ],
+            )
+            try:
+                for email, embedding_id in zip(batch, embedding_ids):
+                    email.embedding_id = embedding_id
+                db.commit()
+            except Exception:
+                db.rollback()
+                await asyncio.to_thread(self.collection.delete, ids=embedding_ids)
+                raise
+            if old_ids:
+                await asyncio.to_thread(self.collection.delete, ids=old_ids)
+            if progress:
+                progress(start + len(batch), len(emails))
+
+        return len(emails)
+
     async def search_emails(self, query: str, db: Session, n_results: int = 10) -> Dict:
         """Search emails using vector similarity and return results"""
+        import numpy as np
+
         try:
             # Get embedding for search query
             query_embedding = await self._get_embedding(query)
 
             # Search in ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"],
-            )
+            results = await self.query([query_embedding], n_results)
 
             if not results["documents"]:
                 return {"results": []}
 
-            search_results = []
-            for doc, metadata, distance in zip(
-                results["documents"][0],
-                results["metadatas"][0],
-                results["distances"][0],
-            ):
-                # Get email from database
-                email = (
-                    db.query(Email)
-                    .filter(Email.thread_id == metadata["thread_id"])
-                    .first()
+            # One email per hit thread, loaded with bodies in one query
+            thread_ids = {
+                metadata.get("thread_id") for metadata in results["metadatas"][0]
+            }
+            emails = {
+                email.thread_id: email
+                for email in db.query(Email)
+                .options(selectinload(Email.body))
+                .filter(Email.thread_id.in_(thread_ids - {None}))
+                .distinct(Email.thread_id)
+                .order_by(Email.thread_id, Email.id)
+            }
+            hits = [
+                (emails[metadata["thread_id"]], 1 - distance)
+                for metadata, distance in zip(
+                    results["metadatas"][0], results["distances"][0]
                 )
-                if not email:
-                    continue
+                if metadata.get("thread_id") in emails
+            ]
 
-                similarity_score = 1 - distance
+            # Get subject similarity, embedding all subjects in one request
+            subject_embeddings = await self._get_embeddings(
+                [email.subject for email, _ in hits]
+            )
 
-                # Get subject similarity
-                subject_similarity = np.dot(
-                    query_embedding, await self._get_embedding(email.subject)
-                )
+            search_results = []
+            for (email, similarity_score), subject_embedding in zip(
+                hits, subject_embeddings
+            ):
+                subject_similarity = np.dot(query_embedding, subject_embedding)
 
                 # Calculate final score with weights
                 final_score = 0.6 * similarity_score + 0.4 * subject_similarity